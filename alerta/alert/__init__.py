@@ -1,21 +1,35 @@
 from __builtin__ import staticmethod
 import os
+import sys
 import datetime
-import json
 from uuid import uuid4
 
 import pytz
 
 from alerta.alert import severity, status
 from alerta.common import log as logging
-from alerta.common.utils import DateEncoder
+from alerta.common import codec
 
 _DEFAULT_TIMEOUT = 3600  # default number of seconds before alert is EXPIRED
 
+_ORIGIN = '%s/%s' % (os.path.basename(sys.argv[0]), os.uname()[1])  # default origin ie. program/hostname
+
 LOG = logging.getLogger(__name__)
 
 
 class Alert(object):
+    """
+    Alert fields are held in slots, which are the only copy of them. The message header and body
+    dicts are built from the slots each time they are asked for, eg. when the alert is sent or
+    stored, so changes to the fields are always reflected and changes made to the dicts are not
+    kept. The id, summary, origin and expire time are worked out on demand if not given.
+    """
+    __slots__ = ('_alertid', 'resource', 'event', 'correlate', 'group', 'value', 'status', 'severity',
+                 'previous_severity', 'environment', 'service', 'text', 'event_type', 'tags', '_origin',
+                 'repeat', 'duplicate_count', 'threshold_info', '_summary', 'timeout', 'last_receive_id',
+                 'create_time', '_expire_time', 'receive_time', 'last_receive_time', 'trend_indication',
+                 'raw_data')
+
     def __init__(self, resource, event, correlate=None, group='Misc', value=None, status=status.UNKNOWN,
                  severity=severity.NORMAL, previous_severity=None, environment=None, service=None,
                  text=None, event_type='exceptionAlert', tags=None, origin=None, repeat=False, duplicate_count=0,
@@ -23,83 +37,114 @@ class Alert(object):
                  create_time=None, expire_time=None, receive_time=None, last_receive_time=None, trend_indication=None,
                  raw_data=None):
 
-        # FIXME(nsatterl): how to fix __program__ for origin???
-        __program__ = 'THIS IS BROKEN'
+        self._alertid = alertid
+        self.resource = resource
+        self.event = event
+        self.correlate = correlate or list()
+        self.group = group
+        self.value = value
+        self.status = status
+        self.severity = severity
+        self.previous_severity = previous_severity
+        self.environment = environment or ['PROD']
+        self.service = service or list()
+        self.text = text
+        self.event_type = event_type
+        self.tags = tags or list()
+        self._origin = origin
+        self.repeat = repeat
+        self.duplicate_count = duplicate_count
+        self.threshold_info = threshold_info
+        self._summary = summary
+        self.timeout = timeout
+        self.last_receive_id = last_receive_id
+        self.create_time = create_time or datetime.datetime.utcnow()
+        self._expire_time = expire_time
+        self.receive_time = receive_time
+        self.last_receive_time = last_receive_time
+        self.trend_indication = trend_indication
+        self.raw_data = raw_data
+
+    @property
+    def alertid(self):
+        if not self._alertid:
+            self._alertid = str(uuid4())
+        return self._alertid
+
+    @property
+    def summary(self):
+        return self._summary or '%s - %s %s is %s on %s %s' % (
+            ','.join(self.environment), self.severity, self.event, self.value, ','.join(self.service), self.resource)
+
+    @property
+    def origin(self):
+        return self._origin or _ORIGIN
+
+    @property
+    def expire_time(self):
+        return self._expire_time or self.create_time + datetime.timedelta(seconds=self.timeout)
 
-        self.alertid = alertid or str(uuid4())
+    def __repr__(self):
+        return 'Alert(header=%r, alert=%r)' % (str(self.get_header()), str(self.get_body()))
 
-        correlate = correlate or list()
-        environment = environment or ['PROD']
-        service = service or list()
-        tags = tags or list()
+    def __str__(self):
+        return codec.dumps(self.get_body(), indent=4)
 
-        create_time = create_time or datetime.datetime.utcnow()
-        expire_time = expire_time or create_time + datetime.timedelta(seconds=timeout)
+    def get_id(self):
+        return self.alertid
 
-        self.summary = summary or '%s - %s %s is %s on %s %s' % (
-            ','.join(environment), severity, event, value, ','.join(service), resource)
+    def get_header(self):
 
-        self.header = {
-            'type': event_type,
+        return {
+            'type': self.event_type,
             'correlation-id': self.alertid,
+            'JMSXGroupID': '%s/%s' % (','.join(self.environment), self.resource),   # keep alerts for a resource in order
         }
 
-        self.alert = {
+    def get_body(self):
+
+        body = {
             'id': self.alertid,
-            'resource': resource,
-            'event': event,
-            'correlatedEvents': correlate,
-            'group': group,
-            'value': value,
-            'severity': severity,
-            'previousSeverity': previous_severity or 'UNKNOWN', # severity.UNKNOWN,
-            'environment': environment,
-            'service': service,
-            'text': text,
-            'type': event_type,
-            'tags': tags,
+            'resource': self.resource,
+            'event': self.event,
+            'correlatedEvents': self.correlate,
+            'group': self.group,
+            'value': self.value,
+            'severity': self.severity,
+            'previousSeverity': self.previous_severity or 'UNKNOWN', # severity.UNKNOWN,
+            'environment': self.environment,
+            'service': self.service,
+            'text': self.text,
+            'type': self.event_type,
+            'tags': self.tags,
             'summary': self.summary,
-            'createTime': create_time,
-            'origin': origin or '%s/%s' % (__program__, os.uname()[1]),
-            'thresholdInfo': threshold_info,
-            'timeout': timeout,
-            'expireTime': expire_time,
-            'repeat': repeat,
-            'duplicateCount': duplicate_count,
-            'rawData': raw_data,
+            'createTime': self.create_time,
+            'origin': self.origin,
+            'thresholdInfo': self.threshold_info,
+            'timeout': self.timeout,
+            'expireTime': self.expire_time,
+            'repeat': self.repeat,
+            'duplicateCount': self.duplicate_count,
+            'rawData': self.raw_data,
         }
 
-        if status:
-            self.alert['status'] = status
-        if receive_time:
-            self.alert['receiveTime'] = receive_time
-        if last_receive_time:
-            self.alert['lastReceiveTime'] = last_receive_time
-        if last_receive_id:
-            self.alert['lastReceiveId'] = last_receive_id
-        if trend_indication:
-            self.alert['trendIndication'] = trend_indication
-
-    def __repr__(self):
-        return 'Alert(header=%r, alert=%r)' % (str(self.header), str(self.alert))
-
-    def __str__(self):
-        return json.dumps(self.alert, cls=DateEncoder, indent=4)
-
-    def get_id(self):
-        return self.alertid
-
-    def get_header(self):
-        return self.header
-
-    def get_body(self):
-        return self.alert
+        if self.status:
+            body['status'] = self.status
+        if self.receive_time:
+            body['receiveTime'] = self.receive_time
+        if self.last_receive_time:
+            body['lastReceiveTime'] = self.last_receive_time
+        if self.last_receive_id:
+            body['lastReceiveId'] = self.last_receive_id
+        if self.trend_indication:
+            body['trendIndication'] = self.trend_indication
+        return body
 
     def get_type(self):
-        return self.header['type']
+        return self.event_type
 
     def receive_now(self):
-        self.alert['receiveTime'] = datetime.datetime.utcnow()
+        self.receive_time = datetime.datetime.utcnow()
 
     def ack(self):
         # TODO(nsatterl): alert.ack()
@@ -117,22 +162,11 @@ class Alert(object):
     def parse_alert(alert):
 
         try:
-            alert = json.loads(alert)
+            alert = codec.loads(alert)
         except ValueError, e:
             LOG.error('Could not parse alert: %s', e)
             return
 
-        for k, v in alert.iteritems():
-            if k in ['createTime', 'receiveTime', 'lastReceiveTime', 'expireTime']:
-                try:
-                    alert[k] = datetime.datetime.strptime(v, '%Y-%m-%dT%H:%M:%S.%fZ')
-                except ValueError, e:
-                    LOG.error('Could not parse date time string: %s', e)
-                    return
-        #         alert[k] = time.replace(tzinfo=pytz.utc)
-
-        print 'ALERT TO PARSE -> %s' % alert
-
         return Alert(
             resource=alert.get('resource', None),
             event=alert.get('event', None),
@@ -165,11 +199,9 @@ class Alert(object):
 
 class Heartbeat(object):
 
-    def __init__(self, origin=None, version='unknown'):
-        # FIXME(nsatterl): how to fix __program__ for origin???
-        __program__ = 'THIS IS BROKEN'
+    def __init__(self, origin=None, version='unknown', heartbeatid=None, create_time=None, receive_time=None):
 
-        self.heartbeatid = str(uuid4())
+        self.heartbeatid = heartbeatid or str(uuid4())
 
         self.header = {
             'type': 'Heartbeat',
@@ -179,16 +211,18 @@ class Heartbeat(object):
         self.heartbeat = {
             'id': self.heartbeatid,
             'type': 'Heartbeat',
-            'createTime': datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + 'Z',
-            'origin': origin or '%s/%s' % (__program__, os.uname()[1]),
+            'createTime': create_time or datetime.datetime.utcnow(),
+            'origin': origin or _ORIGIN,
             'version': version,
         }
+        if receive_time:
+            self.heartbeat['receiveTime'] = receive_time
 
     def __repr__(self):
         return 'Heartbeat(header=%r, alert=%r)' % (str(self.header), str(self.heartbeat))
 
     def __str__(self):
-        return json.dumps(self.heartbeat, cls=DateEncoder, indent=4)
+        return codec.dumps(self.heartbeat, indent=4)
 
     def get_id(self):
         return self.heartbeatid
@@ -201,3 +235,23 @@ class Heartbeat(object):
 
     def get_type(self):
         return self.header['type']
+
+    def receive_now(self):
+        self.heartbeat['receiveTime'] = datetime.datetime.utcnow()
+
+    @staticmethod
+    def parse_heartbeat(heartbeat):
+
+        try:
+            heartbeat = codec.loads(heartbeat)
+        except ValueError, e:
+            LOG.error('Could not parse heartbeat: %s', e)
+            return
+
+        return Heartbeat(
+            origin=heartbeat.get('origin', None),
+            version=heartbeat.get('version', 'unknown'),
+            heartbeatid=heartbeat.get('id', None),
+            create_time=heartbeat.get('createTime', None),
+            receive_time=heartbeat.get('receiveTime', None),
+        )
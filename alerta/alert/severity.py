@@ -76,6 +76,10 @@ _COLOR_MAP = {
 
 ENDC = '\033[0m'
 
+MORE_SEVERE = 'moreSevere'
+LESS_SEVERE = 'lessSevere'
+NO_CHANGE = 'noChange'
+
 
 def is_valid(name):
     return name in _SEVERITY_MAP
@@ -90,3 +94,18 @@ def parse_severity(name):
         if name.lower() == sev.lower():
             return sev
     return 'Not Valid'
+
+
+def trend(previous, current):
+    """
+    Compare two severities and return the trend indication ie. more severe, less severe or no change.
+    """
+    previous_code = name_to_code(previous or UNKNOWN)
+    current_code = name_to_code(current or UNKNOWN)
+
+    if current_code < previous_code:
+        return MORE_SEVERE
+    elif current_code > previous_code:
+        return LESS_SEVERE
+    else:
+        return NO_CHANGE
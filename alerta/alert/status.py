@@ -2,6 +2,8 @@
 Possible alert status codes.
 """
 
+from alerta.alert import severity
+
 OPEN_STATUS_CODE = 1
 ACK_STATUS_CODE = 2
 CLOSED_STATUS_CODE = 3
@@ -36,4 +38,31 @@ def parse_status(name):
     for st in _STATUS_MAP:
         if name.lower() == st.lower():
             return st
-    return 'Not Valid'
\ No newline at end of file
+    return 'Not Valid'
+
+
+def calculate_status(current_severity, previous_severity):
+    """
+    Derive the status of a correlated alert from its change in severity.
+    Returns None if the status should not change.
+    """
+    if current_severity in [severity.DEBUG, severity.INFORM]:
+        return OPEN
+    elif current_severity == severity.NORMAL:
+        return CLOSED
+    elif current_severity == severity.WARNING:
+        if previous_severity in [severity.NORMAL]:
+            return OPEN
+    elif current_severity == severity.MINOR:
+        if previous_severity in [severity.NORMAL, severity.WARNING]:
+            return OPEN
+    elif current_severity == severity.MAJOR:
+        if previous_severity in [severity.NORMAL, severity.WARNING, severity.MINOR]:
+            return OPEN
+    elif current_severity == severity.CRITICAL:
+        if previous_severity in [severity.NORMAL, severity.WARNING, severity.MINOR, severity.MAJOR]:
+            return OPEN
+    else:
+        return UNKNOWN
+
+    return None
@@ -1,16 +1,23 @@
 from flask import Flask
 from flask.ext.pymongo import PyMongo
 
-# Default configuration
-MONGO_HOST = 'localhost'
-MONGO_PORT = 27017
-MONGO_DBNAME = 'monitoring'
+from alerta.common import config
+from alerta.common import codec
+
+CONF = config.CONF
+
+# Under a WSGI container nothing has parsed the configuration, so read the config file and
+# defaults as bin/alerta-api would before the settings below are used
+if not CONF:
+    config.parse_args([], prog='alerta-api', daemon=False)
 
 app = Flask(__name__)
-app.config.from_object(__name__)
+app.config['MONGO_HOST'] = CONF.mongo_host
+app.config['MONGO_PORT'] = CONF.mongo_port
+app.config['MONGO_DBNAME'] = CONF.mongo_db
+app.json_encoder = codec.JSONEncoder
 mongo = PyMongo(app)
 
 
 import views
 import management.views
-
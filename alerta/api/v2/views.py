@@ -1,19 +1,59 @@
-from flask import jsonify, request, current_app
+import re
+import time
+import datetime
+
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from flask import jsonify, request, current_app, g, Response, stream_with_context
 from functools import wraps
 from alerta.api.v2 import app, mongo
+from alerta.common import config
+from alerta.common import log as logging
+from alerta.common import codec
+from alerta.common.mq import Messaging
+from alerta.server.database import alert_from_doc, push_history, archive_history, update_counts, shadow_fields
+from alerta.server.database import SHADOW, SHADOW_FIELDS
 
-import datetime
+LOG = logging.getLogger(__name__)
+CONF = config.CONF
 
 # TODO(nsatterl): put these constants somewhere appropriate
 MAX_HISTORY = -10  # 10 most recent
+PAGE_SIZE = 100  # alerts per page of the v2 alerts API
+MAX_PAGE_SIZE = 1000
+HISTORY_PAGE_SIZE = 10  # hourly buckets per page of alert history
+
+# Request timers shown on the management status page, as recorded by the v1 CGI scripts
+_TIMERS = {
+    'simple_get': ('counter', 'Simple GET requests', 'Requests to the alert status API'),
+    'complex_get': ('timer', 'Complex GET requests', 'Requests to the alert status API'),
+    'update': ('timer', 'PUT requests', 'Requests to update alerts via the API'),
+    'delete': ('timer', 'DELETE requests', 'Requests to delete alerts via the API'),
+    'bad': ('timer', 'Bad requests', 'Failed requests to the API'),
+}
+
+# a filter value containing any of these is a regular expression, otherwise it is one or more
+# literal values separated by "|"
+_REGEX_CHARS = re.compile(r'[\\^$.*+?()\[\]{}]')
+
+mq = None  # connection to the message broker shared by all requests
+
 
 # TODO(nsatterl): use @before_request and @after_request to attach a unique request id
 @app.before_first_request
+def before_first_request():
+
+    global mq
+    mq = Messaging()
+    mq.connect()
+
+
+@app.before_request
 def before_request():
-    # print "load config file with warning message"
-    pass
 
-# TODO(nsatterl): fix JSON-P
+    g.start = time.time()
+
+
 def jsonp(func):
     """Wraps JSONified output for JSONP requests."""
     @wraps(func)
@@ -21,7 +61,7 @@ def jsonp(func):
         callback = request.args.get('callback', False)
         if callback:
             data = str(func(*args, **kwargs).data)
-            content = str(callback) + '(' + data + ')'
+            content = str(callback) + '(' + data + ');'
             mimetype = 'application/javascript'
             return current_app.response_class(content, mimetype=mimetype)
         else:
@@ -29,62 +69,339 @@ def jsonp(func):
     return decorated_function
 
 
+def respond(timer, **response):
+    """
+    Return a v1 API response and add the request time to the timer for the management status page.
+    """
+    diff = time.time() - g.start
+    response['time'] = '%.3f' % diff
+    response['localTime'] = datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+
+    record_time(timer, diff)
+
+    return jsonify(response=response)
+
+
+def bad_request(message):
+    """
+    Return a v1 API error response with HTTP status 400.
+    """
+    response = respond('bad', status='error', message=message)
+    response.status_code = 400
+    return response
+
+
+def get_limit(form, default=0):
+    """
+    Pop the "limit" request argument from form. Raises ValueError if it is not a whole number.
+    """
+    limit = form.pop('limit', [default])[0]
+    if not str(limit).isdigit():
+        raise ValueError('limit must be a whole number, not %r' % limit)
+    return int(limit)
+
+
+def record_time(timer, diff):
+
+    timer_type, title, description = _TIMERS[timer]
+    mongo.db.status.update(
+        {"group": "requests", "name": timer, "type": timer_type, "title": title, "description": description},
+        {'$inc': {"count": 1, "totalTime": int(diff * 1000)}},  # management status needs time in milliseconds
+        upsert=True, w=0)
+
+
+def get_data():
+    """
+    Return the JSON request body, or None if it is not valid JSON.
+    """
+    try:
+        return codec.loads(request.data)
+    except ValueError, e:
+        LOG.warning('Failed to get data - %s', e)
+        return None
+
+
+@app.route('/alerta/api/v1/alerts/alert/<alertid>')
 @app.route('/alerta/api/v2/alerts/alert/<alertid>')
+@jsonp
 def get_alert(alertid):
 
-    alert = mongo.db.alerts.find_one({'_id': alertid})
+    alert = mongo.db.alerts.find_one({'_id': alertid}, {SHADOW: 0})
     if alert:
         fix_id(alert)
-        return jsonify(response={'alert': alert, 'status': 'ok', 'total': 1})
+        return respond('simple_get', alert=alert, status='ok', total=1)
     else:
-        # TODO(nsatterl): include error message as 'message': 'not found' etc.
-        return jsonify(response={"alert": None, "status": "error", "message": "not found", "total": 0})
+        return respond('simple_get', alert=None, status='not found', total=0)
 
 
-@app.route('/alerta/api/v2/alerts')
+@app.route('/alerta/api/v1/alerts')
+@jsonp
 def get_alerts():
 
-    hide_details = request.args.get('hide-alert-details', False, bool)
-    hide_alert_repeats = request.args.getlist('hide-alert-repeats')
+    form = request.args.to_dict(flat=False)
 
-    # TODO(nsatterl): support comma-separated fields eg. fields=event,summary
-    fields = dict((k, 1) for k in request.args.getlist('fields'))
+    hide_details = form.pop('hide-alert-details', ['false'])[0] == 'true'
+    hide_repeats = form.pop('hide-alert-repeats', [])
 
-    # NOTE: if filtering on fields still always include severity and status in response
+    fields = dict()
+    for f in form.pop('fields', []):
+        for field in f.split(','):
+            fields[field] = 1
     if fields:
-        fields['severity'] = 1
+        fields['severity'] = 1  # always include severity and status
         fields['status'] = 1
 
-    if request.args.get('hide-alert-history', False, bool):
+    if form.pop('hide-alert-history', ['false'])[0] == 'true':
         fields['history'] = 0
     else:
-        fields['history'] = {'slice': MAX_HISTORY}
+        fields['history'] = {'$slice': MAX_HISTORY}
+    if 1 not in fields.values():
+        fields[SHADOW] = 0
 
-    alert_limit = request.args.get('limit', 0, int)
+    try:
+        limit = get_limit(form)
+    except ValueError, e:
+        return bad_request(str(e))
 
     query = dict()
     query_time = datetime.datetime.utcnow()
-
-    from_date = request.args.get('from-date')
-    if from_date:
-        from_date = datetime.datetime.strptime(from_date, '%Y-%m-%dT%H:%M:%S.%fZ')
-        from_date = from_date.replace(tzinfo=pytz.utc)
-        to_date = query_time
-        to_date = to_date.replace(tzinfo=pytz.utc)
-        query['lastReceiveTime'] = {'$gt': from_date, '$lte': to_date}
+    if 'from-date' in form:
+        try:
+            from_date = codec.parse_date(form.pop('from-date')[0])
+        except ValueError, e:
+            return bad_request(str(e))
+        query['lastReceiveTime'] = {'$gt': from_date, '$lte': query_time}
 
     sort_by = list()
-    for s in request.args.getlist('sort-by'):
-            if s in ['createTime', 'receiveTime', 'lastReceiveTime']:
-                sort_by.append((s, -1))  # sort by newest first
-            else:
-                sort_by.append((s, 1))   # alpha-numeric sort
+    for s in form.pop('sort-by', []):
+        if s in ['createTime', 'receiveTime', 'lastReceiveTime']:
+            sort_by.append((s, -1))  # sort by newest first
+        else:
+            sort_by.append((s, 1))   # alpha-numeric sort
     if not sort_by:
         sort_by.append(('lastReceiveTime', -1))
 
+    query.update(alert_query(form, hide_repeats))
+
+    status_counts, severity_counts, total, last_time = alert_counts(query)
+    more = bool(limit) and total > limit
 
+    alert_details = list()
+    if not hide_details:
+        LOG.debug('MongoDB GET all -> alerts.find(%s, %s, sort=%s).limit(%s)', query, fields, sort_by, limit)
+        for alert in mongo.db.alerts.find(query, fields, sort=sort_by).limit(limit):
+            alert_details.append(fix_id(alert))
 
-    return jsonify(details=hide_details, repeats=hide_alert_repeats, fields=fields)
+    alerts = {
+        'statusCounts': status_counts,
+        'severityCounts': severity_counts,
+        'alertDetails': alert_details,
+        'lastTime': last_time or query_time,
+    }
+    return respond('complex_get', alerts=alerts, status='ok', total=total, more=more)
+
+
+def alert_query(form, hide_repeats=None):
+    """
+    Return the Mongo query for the alert filters in form, a dict of lists of request arguments.
+    A field name prefixed with "-" excludes matching alerts.
+
+    Literal values for the SHADOW_FIELDS, including alternatives like "web01|web02", are looked
+    up case-insensitively in the lower-cased shadow fields, which are indexed. Only values
+    that are real patterns are matched with a regex. Empty values are ignored.
+    """
+    query = dict()
+    for field, values in form.iteritems():
+        if field in ['callback', '_']:
+            continue
+        values = [v for v in values if v]
+        if not values:
+            continue
+        name = field.lstrip('-')
+        if name in SHADOW_FIELDS and not any(_REGEX_CHARS.search(v) for v in values):
+            literals = [v.lower() for value in values for v in value.split('|') if v]
+            query['%s.%s' % (SHADOW, name)] = {'$nin' if field.startswith('-') else '$in': literals}
+        elif field == 'id':
+            query['_id'] = {'$regex': '^' + values[0]}
+        elif len(values) == 1:
+            if field.startswith('-'):
+                query[field[1:]] = {'$not': re.compile(values[0])}
+            else:
+                query[field] = {'$regex': values[0], '$options': 'i'}  # case insensitive search
+        else:
+            if field.startswith('-'):
+                query[field[1:]] = {'$nin': values}
+            else:
+                query[field] = {'$in': values}
+
+    if hide_repeats:
+        query['$nor'] = [{'severity': {'$in': hide_repeats}, 'repeat': True}]
+
+    return query
+
+
+@app.route('/alerta/api/v2/alerts')
+def get_alerts_page():
+    """
+    Return a page of alerts, newest first, as a streamed JSON response. Pages are keyed on
+    (lastReceiveTime, _id) so they are as fast to fetch at the end of the collection as at
+    the start. Pass the "next" cursor of one page as "cursor" to get the following page.
+    """
+    form = request.args.to_dict(flat=False)
+
+    fields = dict()
+    for f in form.pop('fields', []):
+        for field in f.split(','):
+            if field:
+                fields[field] = 1
+    if fields:
+        fields['severity'] = 1  # always include severity and status
+        fields['status'] = 1
+        fields['lastReceiveTime'] = 1  # needed for the next cursor
+
+    # history is only returned if asked for
+    if form.pop('hide-alert-history', ['true'])[0] == 'false':
+        fields['history'] = {'$slice': MAX_HISTORY}
+    elif not fields:
+        fields['history'] = 0
+    if 1 not in fields.values():
+        fields[SHADOW] = 0
+
+    try:
+        limit = min(get_limit(form, PAGE_SIZE) or PAGE_SIZE, MAX_PAGE_SIZE)
+    except ValueError, e:
+        return bad_request(str(e))
+
+    form.pop('sort-by', None)  # pages are always newest first
+    form.pop('hide-alert-details', None)
+    hide_repeats = form.pop('hide-alert-repeats', [])
+    from_date = form.pop('from-date', None)
+    cursor = form.pop('cursor', [None])[0]
+
+    # alerts without a lastReceiveTime cannot be paged past so are left out
+    query = alert_query(form, hide_repeats)
+    query['lastReceiveTime'] = {'$ne': None}
+    if from_date:
+        try:
+            query['lastReceiveTime'] = {'$gt': codec.parse_date(from_date[0]), '$lte': datetime.datetime.utcnow()}
+        except ValueError, e:
+            return bad_request(str(e))
+    if cursor:
+        last_time, _, last_id = cursor.partition('_')
+        try:
+            last_time = codec.parse_date(last_time)
+        except ValueError:
+            return bad_request('invalid cursor %s' % cursor)
+        query = {'$and': [query, {'$or': [
+            {'lastReceiveTime': {'$lt': last_time}},
+            {'lastReceiveTime': last_time, '_id': {'$lt': last_id}},
+        ]}]}
+
+    LOG.debug('MongoDB GET page -> alerts.find(%s, %s).limit(%s)', query, fields, limit + 1)
+    alerts = mongo.db.alerts.find(query, fields or None, sort=[('lastReceiveTime', -1), ('_id', -1)]).limit(limit + 1)
+
+    def generate():
+
+        yield '{"response":{"status":"ok","alerts":{"alertDetails":['
+
+        total = 0
+        next_cursor = None
+        for alert in alerts:
+            if total == limit:  # there is at least one more page
+                next_cursor = '%s_%s' % (codec.format_date(last['lastReceiveTime']), last['id'])
+                break
+            last = fix_id(alert)
+            yield (',' if total else '') + codec.dumps(last)
+            total += 1
+
+        diff = time.time() - g.start
+        yield '],"next":%s},"total":%s,"more":%s,"time":"%.3f"}}' % (
+            codec.dumps(next_cursor), total, codec.dumps(next_cursor is not None), diff)
+        record_time('complex_get', diff)
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def alert_counts(query):
+    """
+    Count the alerts matching query by status and severity in a single aggregation. Only OPEN or
+    NORMAL alerts contribute to the severity counts. Returns the status and severity counts, the
+    total number of alerts and the latest lastReceiveTime.
+    """
+    pipeline = [
+        {'$match': query},
+        {'$group': {
+            '_id': {'status': '$status', 'severity': '$severity'},
+            'count': {'$sum': 1},
+            'lastTime': {'$max': '$lastReceiveTime'},
+        }},
+    ]
+    LOG.debug('MongoDB GET counts -> alerts.aggregate(%s)', pipeline)
+
+    status_counts, severity_counts = empty_counts()
+    total = 0
+    last_time = None
+
+    for group in mongo.db.alerts.aggregate(pipeline)['result']:
+        count = group['count']
+        add_count(status_counts, severity_counts, group['_id'].get('status'), group['_id'].get('severity'), count)
+
+        total += count
+        if not last_time or group['lastTime'] > last_time:
+            last_time = group['lastTime']
+
+    return status_counts, severity_counts, total, last_time
+
+
+def empty_counts():
+
+    status_counts = {'open': 0, 'ack': 0, 'closed': 0}
+    severity_counts = {'critical': 0, 'major': 0, 'minor': 0, 'warning': 0, 'normal': 0, 'inform': 0, 'debug': 0}
+    return status_counts, severity_counts
+
+
+def add_count(status_counts, severity_counts, alert_status, alert_severity, count):
+
+    if alert_status == 'Open':
+        status_counts['open'] += count
+    elif alert_status == 'Acknowledged':
+        status_counts['ack'] += count
+    elif alert_status == 'Closed':
+        status_counts['closed'] += count
+
+    if alert_severity != 'Normal' and alert_status != 'Open':
+        return
+    sev = (alert_severity or '').lower()
+    if sev in severity_counts:
+        severity_counts[sev] += count
+
+
+@app.route('/alerta/api/v2/counts')
+@jsonp
+def get_counts():
+    """
+    Return the number of alerts by environment, service, severity and status from the counts
+    collection, which alerta-server keeps up to date, so that summary widgets do not have to
+    scan the alerts collection. Filter with environment, service, severity or status.
+    """
+    query = {'count': {'$gt': 0}}
+    for field in ('environment', 'service', 'severity', 'status'):
+        values = request.args.getlist(field)
+        if values:
+            query[field] = {'$in': values}
+
+    LOG.debug('MongoDB GET counts -> counts.find(%s)', query)
+
+    status_counts, severity_counts = empty_counts()
+    total = 0
+    counts = list()
+    for doc in mongo.db.counts.find(query, {'_id': 0}):
+        add_count(status_counts, severity_counts, doc['status'], doc['severity'], doc['count'])
+        total += doc['count']
+        counts.append(doc)
+
+    return respond('simple_get', counts=counts, statusCounts=status_counts, severityCounts=severity_counts,
+                   status='ok', total=total)
 
 
 @app.route('/alerta/api/v1/alerts/alert.json', methods=['POST', 'PUT'])
@@ -92,29 +409,162 @@ def create_alert(alertid):
 
     pass
 
+
+@app.route('/alerta/api/v1/alerts/alert/<alertid>', methods=['POST', 'PUT'])
 @app.route('/alerta/api/v2/alerts/alert/<alertid>', methods=['POST', 'PUT'])
 def modify_alert(alertid):
 
-    pass
-
-
+    update = get_data()
+    if not isinstance(update, dict):
+        return respond('bad', status='error', message='failed to parse json data in body')
+
+    # for clients that don't support a DELETE, use POST with "_method: delete"
+    if update.pop('_method', '').upper() == 'DELETE':
+        return delete_alert(alertid)
+
+    query = {'_id': {'$regex': '^' + alertid}}
+    update['repeat'] = False
+    update.update(shadow_fields(update, SHADOW + '.'))
+
+    if 'severity' in update:
+        previous = mongo.db.alerts.find_one(query, {"severity": 1, "_id": 0})
+        if previous:
+            update['previousSeverity'] = previous['severity']
+
+    modify = {'$set': update}
+    if 'status' in update:
+        history = {"status": update['status'], "updateTime": datetime.datetime.utcnow()}
+        modify['$push'] = push_history(history)
+
+    LOG.debug('MongoDB MODIFY -> alerts.find_and_modify(%s, %s)', query, modify)
+    previous = mongo.db.alerts.find_and_modify(query, modify, new=False, fields={"history": 0})
+    if not previous:
+        return respond('update', status='error', message='No existing alert with that ID found')
+
+    alert = dict(previous)
+    alert.update(update)
+    update_counts(mongo.db, previous, alert)
+
+    # Forward status update to notify topic and logger queue
+    if 'status' in update:
+        archive_history(mongo.db, alert['_id'], [history])
+        alert = alert_from_doc(alert)
+        LOG.info('%s : Fwd alert to %s and %s', alert.get_id(), CONF.outbound_topic, CONF.outbound_queue)
+        mq.send(alert, CONF.outbound_topic)
+        mq.send(alert, CONF.outbound_queue)
+
+    return respond('update', status='ok')
+
+
+@app.route('/alerta/api/v2/alerts/alert/<alertid>/history')
+@jsonp
+def get_history(alertid):
+    """
+    Return the full history of an alert, newest first, a page of hourly buckets at a time. Pass
+    the "next" cursor of one page as "cursor" to get older history.
+    """
+    limit = max(min(request.args.get('limit', HISTORY_PAGE_SIZE, int), MAX_PAGE_SIZE), 1)
+
+    query = {"alertId": alertid}
+    cursor = request.args.get('cursor')
+    if cursor:
+        bucket, _, last_id = cursor.partition('_')
+        try:
+            bucket = codec.parse_date(bucket)
+            last_id = ObjectId(last_id)
+        except (ValueError, InvalidId):
+            return respond('bad', status='error', message='invalid cursor %s' % cursor)
+        query['$or'] = [{"bucket": {'$lt': bucket}}, {"bucket": bucket, "_id": {'$lt': last_id}}]
+
+    buckets = list(mongo.db.history.find(query, sort=[('bucket', -1), ('_id', -1)]).limit(limit + 1))
+
+    next_cursor = None
+    if len(buckets) > limit:
+        buckets = buckets[:limit]
+        next_cursor = '%s_%s' % (codec.format_date(buckets[-1]['bucket']), buckets[-1]['_id'])
+
+    history = list()
+    for bucket in buckets:
+        history.extend(reversed(bucket['history']))
+
+    return respond('complex_get', history=history, status='ok', total=len(history), next=next_cursor,
+                   more=next_cursor is not None)
+
+
+@app.route('/alerta/api/v1/alerts/alert/<alertid>/tag', methods=['POST', 'PUT'])
 @app.route('/alerta/api/v2/alerts/alert/<alertid>/tag', methods=['POST', 'PUT'])
 def tag_alert(alertid):
 
-    pass
+    tag = get_data()
+    if not isinstance(tag, dict) or not tag:
+        return respond('bad', status='error', message='failed to parse json data in body')
+
+    query = {'_id': {'$regex': '^' + alertid}}
 
+    if isinstance(tag.get('tags'), basestring):
+        tag['%s.tags' % SHADOW] = tag['tags'].lower()
 
+    LOG.info('MongoDB TAG -> alerts.update(%s, { $push: %s })', query, tag)
+    error = mongo.db.alerts.update(query, {'$push': tag}, w=1)
+    if error['ok'] == 1:
+        return respond('update', status='ok')
+    return respond('update', status='error', message=error.get('err'))
+
+
+@app.route('/alerta/api/v1/alerts/alert/<alertid>', methods=['DELETE'])
 @app.route('/alerta/api/v2/alerts/alert/<alertid>', methods=['DELETE'])
 def delete_alert(alertid):
 
-    pass
+    query = {'_id': {'$regex': '^' + alertid}}
+    alerts = list(mongo.db.alerts.find(query, {"environment": 1, "service": 1, "severity": 1, "status": 1}))
+    if not alerts:
+        return respond('delete', status='ok')
+
+    query = {'_id': {'$in': [alert['_id'] for alert in alerts]}}
+    LOG.info('MongoDB DELETE -> alerts.remove(%s)', query)
+    error = mongo.db.alerts.remove(query, w=1)
+    if error['ok'] == 1:
+        for alert in alerts:
+            update_counts(mongo.db, old=alert)
+        return respond('delete', status='ok')
+    return respond('delete', status='error', message=error.get('err'))
 
 
+@app.route('/alerta/api/v1/resources')
 @app.route('/alerta/api/v2/resources')
-def get_resources(alertid):
+@jsonp
+def get_resources():
 
-    pass
+    form = request.args.to_dict(flat=False)
+
+    fields = {'environment': 1, 'service': 1, 'resource': 1}
+    try:
+        limit = get_limit(form)
+    except ValueError, e:
+        return bad_request(str(e))
+
+    query = dict()
+    for field, values in form.iteritems():
+        if field in ['callback', '_']:
+            continue
+        if len(values) == 1:
+            query[field] = {'$regex': values[0], '$options': 'i'}  # case insensitive search
+        else:
+            query[field] = {'$in': values}
+
+    LOG.debug('MongoDB GET all -> alerts.find(%s, %s).limit(%s)', query, fields, limit)
 
+    resources = dict()
+    for alert in mongo.db.alerts.find(query, fields).limit(limit):
+        resources[alert['resource']] = {
+            'environment': alert['environment'],
+            'service': alert['service'],
+            'resource': alert['resource'],
+        }
+    resource_details = sorted(resources.values())
+
+    return respond('complex_get', resources={'resourceDetails': resource_details}, status='ok',
+                   total=len(resource_details))
 
 
 def fix_id(alert):
@@ -122,4 +572,3 @@ def fix_id(alert):
         alert['id'] = alert['_id']
         del alert['_id']
     return alert
-
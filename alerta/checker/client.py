@@ -77,6 +77,12 @@ parser.add_option("-o",
                   dest="timeout",
                   default=DEFAULT_TIMEOUT,
                   help="Timeout in seconds that OPEN alert will persist in webapp.")
+parser.add_option("-B",
+                  "--broker",
+                  action="append",
+                  dest="brokers",
+                  help="Message broker host:port, repeat for failover (default: %s)" %
+                       ','.join('%s:%s' % b for b in BROKER_LIST))
 parser.add_option("-q",
                   "--quiet",
                   action="store_true",
@@ -193,7 +199,11 @@ def main():
 
     if (not options.dry_run):
         try:
-            conn = stomp.Connection(BROKER_LIST)
+            if options.brokers:
+                brokers = [(b.partition(':')[0], int(b.partition(':')[2] or 61613)) for b in options.brokers]
+            else:
+                brokers = BROKER_LIST
+            conn = stomp.Connection(brokers)
             conn.start()
             conn.connect(wait=True)
         except Exception, e:
@@ -0,0 +1,160 @@
+"""
+Fast JSON encoding and decoding of alerts, heartbeats and other messages.
+
+Dates are formatted and parsed by hand as ISO 8601 UTC strings with millisecond precision
+eg. "2013-02-23T09:18:05.303Z", which is much faster than datetime.strftime() and
+datetime.strptime(). The fastest available JSON library is used ie. ujson, simplejson or json.
+
+Large messages can be compressed with zlib for sending. The "deflate" content encoding is
+passed alongside the message eg. as a STOMP header, so that consumers know to decompress it.
+"""
+
+import re
+import zlib
+import datetime
+
+try:
+    import ujson as _json
+except ImportError:
+    try:
+        import simplejson as _json
+    except ImportError:
+        import json as _json
+import json
+
+BACKEND = _json.__name__
+
+DEFLATE = 'deflate'
+
+DATE_FIELDS = ('createTime', 'receiveTime', 'lastReceiveTime', 'expireTime', 'updateTime')
+
+_ISO8601 = re.compile(r'(\d{4})-(\d\d)-(\d\d)[T ](\d\d):(\d\d):(\d\d)(?:\.(\d{1,6})\d*)?(Z|[+-]\d\d:?\d\d)?$')
+
+
+def format_date(dt):
+    """
+    Format a datetime as an ISO 8601 UTC string. Naive datetimes are assumed to be UTC.
+    """
+    if dt.tzinfo is not None:
+        dt = (dt - dt.utcoffset()).replace(tzinfo=None)
+    if dt.microsecond:
+        return dt.isoformat()[:23] + 'Z'
+    return dt.isoformat() + '.000Z'
+
+
+def parse_date(s):
+    """
+    Parse an ISO 8601 string and return a naive UTC datetime. Raises ValueError if it is invalid.
+    """
+    try:
+        if len(s) == 24 and s[23] == 'Z' and s[19] == '.' and s[10] == 'T' and s[4] == '-':
+            return datetime.datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]),
+                                     int(s[17:19]), int(s[20:23]) * 1000)
+    except (TypeError, ValueError):
+        pass
+
+    m = _ISO8601.match(s or '')
+    if not m:
+        raise ValueError('Invalid ISO 8601 date time %r' % s)
+
+    year, month, day, hour, minute, second, fraction, tz = m.groups()
+    dt = datetime.datetime(int(year), int(month), int(day), int(hour), int(minute), int(second),
+                           int(fraction.ljust(6, '0')) if fraction else 0)
+    if tz and tz != 'Z':
+        tz = tz.replace(':', '')
+        offset = datetime.timedelta(hours=int(tz[1:3]), minutes=int(tz[3:5]))
+        dt = dt - offset if tz[0] == '+' else dt + offset
+    return dt
+
+
+def _default(obj):
+
+    if isinstance(obj, datetime.datetime):
+        return format_date(obj)
+    raise TypeError('%r is not JSON serializable' % obj)
+
+
+def _prepare(obj):
+    """
+    Replace datetimes with strings for JSON libraries that cannot call a default function.
+    """
+    t = type(obj)
+    if t is datetime.datetime:
+        return format_date(obj)
+    elif t is dict:
+        return dict([(k, _prepare(v)) for k, v in obj.iteritems()])
+    elif t is list or t is tuple:
+        return [_prepare(v) for v in obj]
+    elif isinstance(obj, datetime.datetime):
+        return format_date(obj)
+    elif isinstance(obj, dict):
+        return dict([(k, _prepare(v)) for k, v in obj.iteritems()])
+    elif isinstance(obj, (list, tuple)):
+        return [_prepare(v) for v in obj]
+    return obj
+
+
+if BACKEND == 'ujson':
+    def _dumps(obj):
+        return _json.dumps(_prepare(obj))
+else:
+    _dumps = _json.JSONEncoder(default=_default, separators=(',', ':')).encode
+
+
+def dumps(obj, indent=None):
+    """
+    Serialise to JSON, formatting any datetimes as ISO 8601 strings.
+    """
+    if indent:
+        return json.dumps(obj, default=_default, indent=indent)
+    return _dumps(obj)
+
+
+def loads(s, date_fields=DATE_FIELDS):
+    """
+    Deserialise JSON and parse the ISO 8601 strings in date_fields to datetimes. Raises ValueError
+    if either the JSON or a date is invalid.
+    """
+    obj = _json.loads(s)
+    if isinstance(obj, dict):
+        for k in date_fields:
+            v = obj.get(k)
+            if v:
+                obj[k] = parse_date(v)
+    return obj
+
+
+def compress(s, threshold):
+    """
+    Compress a message with zlib if it is longer than threshold bytes. Returns the message and
+    its content encoding, which is None if it was not compressed.
+    """
+    if threshold and len(s) > threshold:
+        return zlib.compress(s, 1), DEFLATE
+    return s, None
+
+
+def decompress(s, encoding):
+    """
+    Reverse compress() for a message with the given content encoding. Raises ValueError if
+    the encoding is not supported.
+    """
+    if not encoding:
+        return s
+    elif encoding == DEFLATE:
+        try:
+            return zlib.decompress(s)
+        except zlib.error, e:
+            raise ValueError('Invalid compressed message : %s' % e)
+    raise ValueError('Unsupported content encoding %r' % encoding)
+
+
+class JSONEncoder(json.JSONEncoder):
+    """
+    JSON encoder for the standard library, eg. for Flask, that formats datetimes as ISO 8601 strings.
+    """
+    def default(self, obj):
+
+        if isinstance(obj, datetime.datetime):
+            return format_date(obj)
+        return json.JSONEncoder.default(self, obj)
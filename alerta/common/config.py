@@ -34,8 +34,21 @@ def parse_args(argv, prog=None, version='unknown', cli_parser=None, daemon=True)
         'api_port': 80,
         'api_endpoint': '/',   # eg. /Services/API
 
+        'server_processes': 1,
         'server_threads': 4,
+        'server_cache_size': 10000,  # alerts
+        'server_cache_ttl': 300,  # seconds
+        'server_coalesce_window': 100,  # milliseconds, 0 to disable
+        'server_prefetch': 1000,  # unacknowledged messages
+        'server_queue_size': 1000,  # messages per worker thread
+        'ensure_indexes': True,  # create any missing indexes on startup
         'alert_timeout': 86400,  # seconds
+        'history_max': 100,  # history entries kept in each alert, all are in the history collection
+        'housekeeping_interval': 60,  # seconds
+        'housekeeping_batch_size': 100,  # alerts
+        'housekeeping_delete_rate': 500,  # alerts per second, 0 for no limit
+        'housekeeping_retention': 'Closed=7200,Informational=43200',  # seconds by status or severity
+        'heartbeat_interval': 30,  # seconds
         'parser_dir': '/opt/alerta/bin/parsers',
 
         'mongo_host': 'localhost',
@@ -43,12 +56,20 @@ def parse_args(argv, prog=None, version='unknown', cli_parser=None, daemon=True)
         'mongo_db': 'monitoring',
         'mongo_collection': 'alerts',
 
+        'messaging_transport': 'stomp',  # stomp, amqp or memory
+        'messaging_compress_threshold': 1024,  # bytes, compress larger message bodies (0 to disable)
+
         'stomp_host': 'localhost',
         'stomp_port': 61613,
+        'stomp_failover': '',  # eg. broker2:61613,broker3:61613
+        'stomp_reconnect_delay': 1,  # seconds, doubled after each failed attempt
+        'stomp_reconnect_max': 60,  # seconds
+        'stomp_buffer_size': 10000,  # messages
 
         'inbound_queue': '/queue/alerts',   # TODO(nsatterl): 'alert_queue' and 'alert_topic' ?
         'outbound_topic': '/topic/notify',
         'outbound_queue': '/queue/logger',
+        'deadletter_queue': '/queue/DLQ.alerts',  # alerts that alerta-server failed to process
 
         'rabbit_host': 'localhost',
         'rabbit_port': 5672,
@@ -60,6 +81,8 @@ def parse_args(argv, prog=None, version='unknown', cli_parser=None, daemon=True)
         'syslog_udp_port': 5140,
         'syslog_tcp_port': 5140,
         'syslog_facility': 'local7',
+        'syslog_threads': 2,
+        'syslog_queue_size': 10000,  # messages
     }
     CONF.update(SYSTEM_DEFAULTS)
 
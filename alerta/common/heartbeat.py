@@ -0,0 +1,81 @@
+import time
+import random
+import threading
+
+from alerta.common import log as logging
+from alerta.common import config
+from alerta.alert import Heartbeat
+
+LOG = logging.getLogger(__name__)
+CONF = config.CONF
+
+JITTER = 0.1  # +/- fraction of the heartbeat interval
+
+
+class HeartbeatScheduler(threading.Thread):
+    """
+    Send heartbeats for one or more origins at a fixed interval, independently of how busy the
+    daemon is. Each interval is randomised by +/- JITTER so that daemons started together do not
+    all send at once, and all heartbeats that are due on a wakeup are sent together.
+    """
+    def __init__(self, mq, interval=None):
+
+        threading.Thread.__init__(self, name='HeartbeatScheduler')
+        self.daemon = True
+
+        self.mq = mq
+        self.interval = interval or CONF.heartbeat_interval
+
+        self.origins = dict()  # origin -> [version, next due time]
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def add(self, origin=None, version='unknown'):
+        """
+        Register an origin, by default the program/hostname origin that Heartbeat fills in. The
+        first heartbeat is sent on the next wakeup.
+        """
+        with self.lock:
+            self.origins[origin] = [version, 0]
+
+    def remove(self, origin):
+
+        with self.lock:
+            self.origins.pop(origin, None)
+
+    def next_interval(self):
+
+        return self.interval * (1 + random.uniform(-JITTER, JITTER))
+
+    def send_due(self):
+        """
+        Send a heartbeat for every origin that is due and return the number of seconds until the
+        next one is due.
+        """
+        now = time.time()
+        with self.lock:
+            due = [(origin, entry) for origin, entry in self.origins.iteritems() if entry[1] <= now]
+            for origin, entry in due:
+                entry[1] = now + self.next_interval()
+            wait = min([entry[1] for entry in self.origins.values()] or [now + self.interval]) - now
+
+        for origin, entry in due:
+            heartbeat = Heartbeat(origin=origin, version=entry[0])
+            origin = heartbeat.get_body()['origin']
+            LOG.debug('Send heartbeat for %s...', origin)
+            try:
+                self.mq.send(heartbeat)
+            except Exception, e:
+                LOG.warning('Failed to send heartbeat for %s: %s', origin, e)
+
+        return max(wait, 0)
+
+    def run(self):
+
+        wait = 0
+        while not self.stopped.wait(wait):
+            wait = self.send_due()
+
+    def stop(self):
+
+        self.stopped.set()
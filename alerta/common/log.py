@@ -13,6 +13,8 @@ CONF = config.CONF
 _DEFAULT_LOG_FORMAT = "%(asctime)s.%(msecs).03d %(name)s[%(process)d] %(threadName)s %(levelname)s - %(message)s"
 _DEFAULT_LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
+DEBUG = logging.DEBUG
+
 # TODO(nsatterl): log exceptions (checkout how OpenStack do it)
 
 
@@ -1,81 +1,489 @@
 import time
-import json
+import itertools
+import threading
+import Queue
+from collections import OrderedDict
+
 import stomp
 
 from alerta.common import log as logging
 from alerta.common import config
-from alerta.common.utils import DateEncoder
+from alerta.common import codec
 
 LOG = logging.getLogger('stomp.py')
 CONF = config.CONF
 
+_RETRY_INTERVAL = 1  # seconds between attempts to send a message while disconnected
+_FLUSH_TIMEOUT = 5  # seconds to wait for buffered messages to be sent on disconnect
+
+
+def broker_list():
+    """
+    Return the brokers to connect to in order of preference ie. stomp_host:stomp_port followed
+    by those in the comma-separated stomp_failover setting eg. "broker2:61613,broker3:61613"
+    """
+    brokers = [(CONF.stomp_host, CONF.stomp_port)]
+    for broker in CONF.stomp_failover.split(','):
+        broker = broker.strip()
+        if broker:
+            host, _, port = broker.partition(':')
+            brokers.append((host, int(port or CONF.stomp_port)))
+    return brokers
+
+
+def encode(alert):
+    """
+    Serialise an alert for sending, compressing the message body if it is larger than
+    messaging_compress_threshold. Returns the message and its headers, which include
+    "content-encoding" if the message was compressed.
+    """
+    message, encoding = codec.compress(codec.dumps(alert.get_body()), CONF.messaging_compress_threshold)
+    headers = alert.get_header()
+    if encoding:
+        headers['content-encoding'] = encoding
+    return message, headers
+
+
+def decode(headers, body):
+    """
+    Return the JSON message body, decompressing it if necessary.
+    """
+    return codec.decompress(body, headers.get('content-encoding'))
+
+
+def Messaging():
+    """
+    Return a connection to the message broker for the configured messaging_transport
+    ie. "stomp" (ActiveMQ), "amqp" (RabbitMQ) or "memory" (in-process, for tests and benchmarks).
+    """
+    if CONF.messaging_transport == 'amqp':
+        from alerta.common.amqp import AmqpMessaging
+        return AmqpMessaging()
+    elif CONF.messaging_transport == 'memory':
+        return MemoryMessaging()
+    else:
+        return StompMessaging()
 
-class Messaging(object):
 
+class StompMessaging(object):
+    """
+    STOMP transport. Messages are serialised once and buffered locally. A publisher thread sends them to the
+    broker one after the other without waiting on each frame, so callers are never blocked by
+    a slow or unavailable broker. If the buffer fills up during a broker outage new messages
+    are dropped and counted.
+
+    Each message is sent with a receipt request and kept until the broker acknowledges it, up to
+    stomp_buffer_size messages after which the oldest are forgotten and counted as unconfirmed.
+    If the connection is lost, the brokers in broker_list() are retried with exponential backoff,
+    subscriptions are restored and any unacknowledged messages are sent again. Received message
+    ids are tagged with the connection they arrived on and acknowledgements for messages from an
+    earlier connection are discarded, as the broker will redeliver those messages anyway.
+    """
     def __init__(self):
         logging.setup('stomp.py')
 
+        self.connection = None
+        self.callback = None
+        self.wait = False
+        self.subscriptions = list()
+
+        self.buffer = Queue.Queue(maxsize=CONF.stomp_buffer_size)
+        self.dropped = 0
+        self.unconfirmed = 0
+        self.connected = threading.Event()
+        self.closing = False
+        self.publisher = None
+
+        self.inflight = OrderedDict()  # receipt id -> unacknowledged message
+        self.inflight_lock = threading.Lock()
+        self.receipts = itertools.count()
+        self.replay = list()
+        self.resend = False
+
+        self.closed = threading.Event()
+        self.reconnector = None
+        self.reconnect_lock = threading.Lock()
+        self.session = 0  # incremented on every new connection
+
     def connect(self, callback=None, wait=False):
         self.callback = callback
         self.wait = wait
-        try:
-            self.connection = stomp.Connection([(CONF.stomp_host, CONF.stomp_port)])
-            if self.callback:
-                self.connection.set_listener('', self.callback)
-            self.connection.start()
-            self.connection.connect(wait=self.wait)
-        except Exception, e:
-            LOG.error('Could not connect to broker %s:%s : %s', CONF.stomp_host, CONF.stomp_port, e)
-            return
 
-        LOG.info('Connected to broker %s:%s', CONF.stomp_host, CONF.stomp_port)
+        if not self._connect():
+            self.reconnect()
+
+        if not self.publisher:
+            self.publisher = threading.Thread(target=self._publish, name='Publisher')
+            self.publisher.daemon = True
+            self.publisher.start()
 
     def reconnect(self):
+        """
+        Reconnect in the background, backing off exponentially between attempts.
+        """
+        with self.reconnect_lock:
+            if self.closed.is_set() or (self.reconnector and self.reconnector.isAlive()):
+                return
+            self.reconnector = threading.Thread(target=self._reconnect, name='Reconnect')
+            self.reconnector.daemon = True
+            self.reconnector.start()
+
+    def _reconnect(self):
+
+        self.resend = True  # once reconnected, resend messages the broker did not acknowledge
+
+        delay = CONF.stomp_reconnect_delay
+        while not self.closed.wait(delay):
+            if self._connect():
+                for destination, ack, headers in self.subscriptions:
+                    self.connection.subscribe(headers, destination=destination, ack=ack)
+                return
+            delay = min(delay * 2, CONF.stomp_reconnect_max)
+            LOG.warning('Will retry connecting to broker in %s seconds', delay)
+
+    def _connect(self):
+        if self.connection:
+            self._close(self.connection)
+
+        brokers = broker_list()
+        session = self.session + 1
         try:
-            self.connection = stomp.Connection([(CONF.stomp_host, CONF.stomp_port)])
+            connection = stomp.Connection(brokers, reconnect_attempts_max=1)
+            connection.set_listener('publisher', PublisherListener(self))
             if self.callback:
-                self.connection.set_listener('', self.callback)
-            self.connection.start()
-            self.connection.connect(wait=self.wait)
+                connection.set_listener('', DecodingListener(self.callback, session))
+            connection.start()
+            connection.connect(wait=self.wait)
         except Exception, e:
-            LOG.error('Could not connect to broker %s:%s : %s', CONF.stomp_host, CONF.stomp_port, e)
-            return
+            LOG.error('Could not connect to brokers %s : %s', brokers, e)
+            return False
 
-        LOG.info('Connected to broker %s:%s', CONF.stomp_host, CONF.stomp_port)
+        self.connection = connection
+        self.session = session
+        LOG.info('Connected to broker %s', self.connection.get_host_and_port())
+        return True
 
-    def subscribe(self, destination=None, ack='auto'):
+    @staticmethod
+    def _close(connection):
+        """
+        Close a lost connection without its listeners starting another reconnect.
+        """
+        try:
+            connection.remove_listener('publisher')
+            connection.remove_listener('')
+            connection.disconnect()
+        except Exception, e:
+            LOG.debug('Could not close connection to broker : %s', e)
 
+    def subscribe(self, destination=None, ack='auto', prefetch=None):
+        """
+        Subscribe to a destination. With ack='client-individual' every message must be acknowledged
+        using ack() and the broker dispatches at most prefetch unacknowledged messages at a time.
+        """
         self.destination = destination or CONF.inbound_queue
 
-        self.connection.subscribe(destination=self.destination, ack=ack)
+        headers = dict()
+        if prefetch:
+            headers['activemq.prefetchSize'] = prefetch
+        self.subscriptions.append((self.destination, ack, headers))
+
+        if self.connection:
+            self.connection.subscribe(headers, destination=self.destination, ack=ack)
+
+    def ack(self, message_id):
+
+        session, _, message_id = message_id.partition('|')
+        if session != str(self.session):
+            LOG.debug('Message %s was received on an earlier connection, not acknowledged', message_id)
+            return
+        try:
+            self.connection.ack({'message-id': message_id})
+        except Exception, e:
+            LOG.warning('Could not acknowledge message %s : %s', message_id, e)
 
     def send(self, alert, destination=None):
 
-        self.destination = destination or CONF.inbound_queue
+        destination = destination or CONF.inbound_queue
+
+        if LOG.isEnabledFor(logging.DEBUG):
+            LOG.debug('header = %s', alert.get_header())
+            LOG.debug('message = %s', alert.get_body())
+
+        message, headers = encode(alert)
+        self._buffer(message, headers, destination)
+
+    def send_many(self, alerts, destination=None):
+
+        destination = destination or CONF.inbound_queue
+
+        for alert in alerts:
+            message, headers = encode(alert)
+            self._buffer(message, headers, destination)
 
-        LOG.debug('header = %s', alert.get_header())
-        LOG.debug('message = %s', alert.get_body())
+    def _buffer(self, message, headers, destination):
 
-        while not self.connection.is_connected():
-            LOG.warning('Waiting for message broker to become available...')
-            time.sleep(0.1)
+        try:
+            self.buffer.put_nowait((message, headers, destination))
+        except Queue.Full:
+            self.dropped += 1
+            LOG.error('Message buffer full, dropped %s to %s (%s dropped)',
+                      headers.get('correlation-id'), destination, self.dropped)
+
+    def _publish(self):
+
+        while True:
+            item = self.buffer.get()
+            if item is None:
+                break
+
+            message, headers, destination = item
+            while not self._send(message, headers, destination):
+                if self.closing:
+                    LOG.error('Could not send %s to %s before disconnect', headers.get('correlation-id'), destination)
+                    break
+                self.connected.wait(_RETRY_INTERVAL)
+
+    def _send(self, message, headers, destination):
+
+        if not self.connected.is_set():
+            return False
+
+        if self.resend:
+            self.resend = False
+            with self.inflight_lock:
+                self.replay.extend(self.inflight.values())
+                self.inflight.clear()
+            LOG.info('Resending %s unacknowledged messages', len(self.replay))
+        while self.replay:
+            if not self._write(*self.replay[0]):
+                return False
+            self.replay.pop(0)
+
+        return self._write(message, headers, destination)
 
-        LOG.debug('Sending alert to message broker...')
+    def _write(self, message, headers, destination):
+
+        receipt = 'alerta-%s' % self.receipts.next()
+        with self.inflight_lock:
+            self.inflight[receipt] = (message, headers, destination)
+            while len(self.inflight) > CONF.stomp_buffer_size:
+                self.inflight.popitem(last=False)
+                self.unconfirmed += 1
+                LOG.warning('Too many messages awaiting a receipt from the broker (%s unconfirmed)',
+                            self.unconfirmed)
+
+        headers = dict(headers, receipt=receipt)
+        if 'content-encoding' in headers:
+            headers['content-length'] = len(message)  # binary body may contain NUL bytes
         try:
-            self.connection.send(message=json.dumps(alert.get_body(), cls=DateEncoder), headers=alert.get_header(),
-                                 destination=self.destination)
+            self.connection.send(message=message, headers=headers, destination=destination)
         except Exception, e:
-            LOG.error('Could not send to broker %s:%s : %s', CONF.stomp_host, CONF.stomp_port, e)
+            LOG.error('Could not send to broker %s : %s', self.connection.get_host_and_port(), e)
+            with self.inflight_lock:
+                self.inflight.pop(receipt, None)
+            return False
+        LOG.debug('Message %s sent to %s', headers.get('correlation-id'), destination)
+        return True
+
+    def on_receipt(self, receipt):
+
+        with self.inflight_lock:
+            self.inflight.pop(receipt, None)
+
+    def on_connected(self):
+
+        self.connected.set()
+
+    def on_disconnected(self):
+
+        self.connected.clear()
+        if not self.closed.is_set():
+            LOG.warning('Connection to broker lost, reconnecting...')
+            self.reconnect()
+
+    def flush(self, timeout=_FLUSH_TIMEOUT):
+        """
+        Stop the publisher thread after sending any buffered messages and wait for the broker
+        to acknowledge them, waiting up to timeout seconds in total.
+        """
+        if not self.publisher:
             return
-        LOG.info('Message sent to broker %s:%s', CONF.stomp_host, CONF.stomp_port)
+        deadline = time.time() + timeout
+        try:
+            self.buffer.put(None, timeout=timeout)
+        except Queue.Full:
+            pass
+        self.publisher.join(max(deadline - time.time(), 0))
+        if self.publisher.isAlive():
+            self.closing = True
+            LOG.warning('%s buffered messages not sent to broker', self.buffer.qsize())
+        self.publisher = None
+
+        while self.inflight and self.connected.is_set() and time.time() < deadline:
+            time.sleep(0.01)
+        if self.inflight:
+            LOG.warning('%s messages not acknowledged by broker', len(self.inflight))
 
     def disconnect(self):
-        if self.connection.is_connected():
-            LOG.info('Disconnecting from broker %s:%s', CONF.stomp_host, CONF.stomp_port)
+        self.flush()
+        self.closed.set()
+        if self.connection and self.connection.is_connected():
+            LOG.info('Disconnecting from broker %s', self.connection.get_host_and_port())
             self.connection.disconnect()
         LOG.info('Disconnected!')
 
 
+class MemoryBroker(object):
+    """
+    In-process broker for MemoryMessaging. Messages sent to a queue go to one subscriber in turn,
+    or wait for one if there are none yet, and messages sent to a topic go to every subscriber.
+    """
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.subscribers = dict()  # destination -> subscriber inboxes
+        self.backlog = dict()      # queue destination -> messages waiting for a subscriber
+        self.count = 0
+
+    def subscribe(self, destination, inbox):
+
+        with self.lock:
+            self.subscribers.setdefault(destination, list()).append(inbox)
+            for message in self.backlog.pop(destination, list()):
+                inbox.put(message)
+
+    def unsubscribe(self, inbox):
+
+        with self.lock:
+            for inboxes in self.subscribers.values():
+                if inbox in inboxes:
+                    inboxes.remove(inbox)
+
+    def publish(self, destination, headers, body):
+
+        with self.lock:
+            inboxes = self.subscribers.get(destination)
+            if destination.startswith('/topic/'):
+                for inbox in inboxes or list():
+                    inbox.put((headers, body))
+            elif inboxes:
+                self.count += 1
+                inboxes[self.count % len(inboxes)].put((headers, body))
+            else:
+                self.backlog.setdefault(destination, list()).append((headers, body))
+
+
+BROKER = MemoryBroker()
+
+
+class MemoryMessaging(object):
+    """
+    In-memory transport with the same interface as StompMessaging, so that the daemons can be
+    tested and benchmarked without a message broker. Messages are delivered to the callback
+    on a dispatcher thread.
+    """
+    def __init__(self):
+
+        self.callback = None
+        self.inbox = Queue.Queue()
+        self.dispatcher = None
+        self.message_ids = itertools.count()
+
+    def connect(self, callback=None, wait=False):
+
+        self.callback = callback
+
+    def subscribe(self, destination=None, ack='auto', prefetch=None):
+
+        self.destination = destination or CONF.inbound_queue
+        BROKER.subscribe(self.destination, self.inbox)
+
+        if not self.dispatcher:
+            self.dispatcher = threading.Thread(target=self._dispatch, name='Dispatcher')
+            self.dispatcher.daemon = True
+            self.dispatcher.start()
+
+    def _dispatch(self):
+
+        while True:
+            message = self.inbox.get()
+            if message is None:
+                break
+            headers, body = message
+            try:
+                self.callback.on_message(headers, decode(headers, body))
+            except Exception, e:
+                LOG.error('Failed to handle message %s : %s', headers.get('correlation-id'), e)
+
+    def send(self, alert, destination=None):
+
+        self.send_many([alert], destination)
+
+    def send_many(self, alerts, destination=None):
+
+        destination = destination or CONF.inbound_queue
+
+        for alert in alerts:
+            body, headers = encode(alert)
+            headers = dict(headers)
+            headers['message-id'] = 'ID:memory-%s' % self.message_ids.next()
+            BROKER.publish(destination, headers, body)
+
+    def ack(self, message_id):
+
+        pass
+
+    def disconnect(self):
+
+        BROKER.unsubscribe(self.inbox)
+        if self.dispatcher:
+            self.inbox.put(None)
+            self.dispatcher.join()
+
+
+class PublisherListener(stomp.ConnectionListener):
+    """
+    Pass connection state changes and receipts on to StompMessaging.
+    """
+    def __init__(self, messaging):
+        self.messaging = messaging
+
+    def on_connected(self, headers, body):
+        self.messaging.on_connected()
+
+    def on_disconnected(self):
+        self.messaging.on_disconnected()
+
+    def on_receipt(self, headers, body):
+        self.messaging.on_receipt(headers.get('receipt-id'))
+
+
+class DecodingListener(object):
+    """
+    Wrap a message handler so that it receives decompressed message bodies. If session is given,
+    message ids are prefixed with it eg. "3|ID:broker-1234:1:1:1:1" so that StompMessaging can tell
+    which connection a message was received on. Everything else is passed straight through to
+    the handler.
+    """
+    def __init__(self, handler, session=None):
+        self.handler = handler
+        self.session = session
+
+    def on_message(self, headers, body):
+        try:
+            body = decode(headers, body)
+        except ValueError, e:
+            LOG.error('Could not decode message %s : %s', headers.get('correlation-id'), e)
+            return
+        if self.session is not None and 'message-id' in headers:
+            headers = dict(headers)
+            headers['message-id'] = '%s|%s' % (self.session, headers['message-id'])
+        self.handler.on_message(headers, body)
+
+    def __getattr__(self, name):
+        return getattr(self.handler, name)
+
+
 class MessageHandler(object):
     """
     A generic message handler class.
@@ -90,7 +498,6 @@ class MessageHandler(object):
         LOG.info('Connected to %s %s', headers, body)
 
     def on_disconnected(self):
-        # TODO(nsatterl): auto-reconnect
         LOG.error('Connection to messaging server has been lost.')
 
     def on_message(self, headers, body):
@@ -0,0 +1,106 @@
+import os
+import time
+import threading
+
+import yaml
+
+from alerta.common import log as logging
+from alerta.common import config
+
+LOG = logging.getLogger(__name__)
+CONF = config.CONF
+
+_CHECK_INTERVAL = 1  # seconds between checks for a modified file
+
+
+class WatchedFile(object):
+    """
+    Load a file once and reload it only when its modification time changes. The file
+    is checked at most once every interval seconds. If a reload fails the last good
+    value is kept.
+    """
+    def __init__(self, path, loader, default=None, interval=_CHECK_INTERVAL):
+
+        self.path = path
+        self.loader = loader
+        self.interval = interval
+
+        self._value = default
+        self._mtime = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+
+        if time.time() - self._checked >= self.interval:
+            with self._lock:
+                if time.time() - self._checked >= self.interval:
+                    self._reload()
+                    self._checked = time.time()
+        return self._value
+
+    def _reload(self):
+
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError, e:
+            if self._mtime is not None or not self._checked:
+                LOG.warning('Failed to load %s: %s', self.path, e)
+            self._mtime = None
+            return
+
+        if mtime == self._mtime:
+            return
+
+        try:
+            self._value = self.loader(self.path)
+            LOG.info('Loaded %s OK', self.path)
+        except Exception, e:
+            LOG.warning('Failed to load %s: %s', self.path, e)
+        self._mtime = mtime
+
+
+def load_yaml(path):
+
+    with open(path) as f:
+        return yaml.load(f) or list()
+
+
+def compile_parser(path):
+
+    with open(path) as f:
+        return compile(f.read(), path, 'exec')
+
+
+class Parsers(object):
+    """
+    Parser scripts compiled once and recompiled only when they are modified.
+    """
+    def __init__(self, parser_dir=None):
+
+        self.parser_dir = parser_dir or CONF.parser_dir
+        self._parsers = dict()
+
+    def get(self, name):
+
+        parser = self._parsers.get(name)
+        if parser is None:
+            parser = self._parsers.setdefault(
+                name, WatchedFile('%s/%s.py' % (self.parser_dir, name), compile_parser))
+        return parser.get()
+
+    def run(self, name, namespace):
+        """
+        Execute a parser in the given namespace. Returns True if the parser ran OK.
+        """
+        code = self.get(name)
+        if code is None:
+            LOG.warning('Parser %s not available', name)
+            return False
+        try:
+            exec code in namespace
+        except Exception, e:
+            LOG.warning('Parser %s failed: %s', name, e)
+            return False
+        LOG.debug('Parser %s/%s exec OK', self.parser_dir, name)
+        return True
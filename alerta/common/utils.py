@@ -3,12 +3,16 @@
 import json
 import datetime
 
+from alerta.common.codec import format_date
+
 
 # Extend JSON Encoder to support ISO 8601 format dates
 class DateEncoder(json.JSONEncoder):
     def default(self, obj):
 
-        if isinstance(obj, (datetime.date, datetime.datetime)):
-            return obj.replace(microsecond=0).isoformat() + ".%03dZ" % (obj.microsecond // 1000)
+        if isinstance(obj, datetime.datetime):
+            return format_date(obj)
+        elif isinstance(obj, datetime.date):
+            return obj.isoformat()
         else:
             return json.JSONEncoder.default(self, obj)
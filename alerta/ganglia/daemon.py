@@ -16,14 +16,13 @@ from alerta.common import log as logging
 from alerta.common.daemon import Daemon
 from alerta.alert import Alert, Heartbeat
 from alerta.alert import syslog
-from alerta.common.mq import Messaging
+from alerta.common.mq import Messaging, broker_list
 
 Version = '2.0.0'
 
 LOG = logging.getLogger(__name__)
 CONF = config.CONF
 
-BROKER_LIST = [('localhost', 61613)] # list of brokers for failover
 ALERT_QUEUE = '/queue/alerts'
 EXPIRATION_TIME = 600 # seconds = 10 minutes
 
@@ -160,7 +159,7 @@ class GangliaDaemon(Daemon):
         logging.info('Connect to broker')
         try:
             conn = stomp.Connection(
-                BROKER_LIST,
+                broker_list(),
                 reconnect_sleep_increase=5.0,
                 reconnect_sleep_max=120.0,
                 reconnect_attempts_max=20
@@ -16,7 +16,8 @@ import urllib2
 from alerta.common import config
 from alerta.common import log as logging
 from alerta.common.daemon import Daemon
-from alerta.alert import Alert, Heartbeat
+from alerta.alert import Alert
+from alerta.common.heartbeat import HeartbeatScheduler
 from alerta.common.mq import Messaging, MessageHandler
 
 Version = '2.0.0'
@@ -157,6 +158,10 @@ class IrcbotDaemon(Daemon):
         self.mq.connect(callback=MessageHandler(irc))
         self.mq.connect()
 
+        self.heartbeat = HeartbeatScheduler(self.mq)
+        self.heartbeat.add(version=Version)
+        self.heartbeat.start()
+
         while not self.shuttingdown:
             try:
                 ip, op, rdy = select.select([irc], [], [], _SELECT_TIMEOUT)
@@ -176,11 +181,6 @@ class IrcbotDaemon(Daemon):
                             ack_alert(data.split()[4])
                         if data.find('!alerta quit') != -1:
                             irc.send('QUIT\r\n')
-                if not ip:
-                    LOG.debug('Send heartbeat...')
-                    heartbeat = Heartbeat(version=ircbot.version)
-                    self.mq.send(heartbeat)
-
                 time.sleep(0.1)
 
             except (KeyboardInterrupt, SystemExit):
@@ -190,5 +190,7 @@ class IrcbotDaemon(Daemon):
         LOG.info('Shutdown request received...')
         self.running = False
 
+        self.heartbeat.stop()
+
         LOG.info('Disconnecting from message broker...')
         self.mq.disconnect()
\ No newline at end of file
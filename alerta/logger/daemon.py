@@ -9,7 +9,8 @@ from alerta.common import config
 
 from alerta.common.daemon import Daemon
 from alerta.common.mq import Messaging, MessageHandler
-from alerta.alert import Alert, Heartbeat
+from alerta.alert import Alert
+from alerta.common.heartbeat import HeartbeatScheduler
 from alerta.common.utils import DateEncoder
 
 Version = '2.0.0'
@@ -31,18 +32,20 @@ class LoggerDaemon(Daemon):
         self.mq.connect(callback=LoggerMessage())
         self.mq.subscribe(destination=CONF.outbound_queue)
 
+        self.heartbeat = HeartbeatScheduler(self.mq)
+        self.heartbeat.add(version=Version)
+        self.heartbeat.start()
+
         while not self.shuttingdown:
             try:
                 LOG.debug('Waiting for log messages...')
                 time.sleep(30)
 
-                LOG.debug('Send heartbeat...')
-                heartbeat = Heartbeat()
-                self.mq.send(heartbeat)
-
             except (KeyboardInterrupt, SystemExit):
                 self.shuttingdown = True
 
+        self.heartbeat.stop()
+
         LOG.info('Shutdown request received...')
         self.running = False
 
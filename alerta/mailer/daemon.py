@@ -20,14 +20,13 @@ from alerta.common import config
 from alerta.common import log as logging
 from alerta.common.daemon import Daemon
 from alerta.alert import Alert, Heartbeat
-from alerta.common.mq import Messaging
+from alerta.common.mq import Messaging, DecodingListener, broker_list
 
 Version = '2.0.0'
 
 LOG = logging.getLogger(__name__)
 CONF = config.CONF
 
-BROKER_LIST = [('localhost', 61613)] # list of brokers for failover
 NOTIFY_TOPIC = '/topic/notify'
 ALERTA_URL = 'http://monitoring.guprod.gnl'
 SMTP_SERVER = 'mx'
@@ -73,12 +72,12 @@ class MailerDaemon(Daemon):
     # Connect to message broker
     try:
         conn = stomp.Connection(
-            BROKER_LIST,
+            broker_list(),
             reconnect_sleep_increase=5.0,
             reconnect_sleep_max=120.0,
             reconnect_attempts_max=20
         )
-        conn.set_listener('', MessageHandler())
+        conn.set_listener('', DecodingListener(MessageHandler()))
         conn.start()
         conn.connect(wait=True)
         conn.subscribe(destination=NOTIFY_TOPIC)
@@ -20,14 +20,13 @@ from alerta.common import log as logging
 from alerta.common.daemon import Daemon
 from alerta.alert import Alert, Heartbeat
 from alerta.alert import syslog
-from alerta.common.mq import Messaging
+from alerta.common.mq import Messaging, DecodingListener, broker_list
 
 Version = '2.0.0'
 
 LOG = logging.getLogger(__name__)
 CONF = config.CONF
 
-BROKER_LIST = [('localhost', 61613)] # list of brokers for failover
 NOTIFY_TOPIC = '/topic/notify'
 
 DISABLE = '/opt/alerta/alerta/alert-notify.disable'
@@ -101,8 +100,8 @@ class NotifyDaemon(Daemon):
 
     # Connect to message broker
     try:
-        conn = stomp.Connection(BROKER_LIST)
-        conn.set_listener('', MessageHandler())
+        conn = stomp.Connection(broker_list())
+        conn.set_listener('', DecodingListener(MessageHandler()))
         conn.start()
         conn.connect(wait=True)
         conn.subscribe(destination=NOTIFY_TOPIC, ack='auto', headers={'selector': "repeat = 'false'"})
@@ -0,0 +1,114 @@
+import time
+from collections import OrderedDict
+
+from alerta.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class AlertCache(object):
+    """
+    Bounded LRU cache of alerts keyed on (environment, resource, event) where event is the alert
+    event or one of its correlated events. Each entry holds the alert id, event, severity and status
+    so that duplicate and correlated alerts can be classified without reading from MongoDB.
+
+    Entries older than ttl seconds are discarded on lookup so that changes made outside the
+    server (eg. via the API) are eventually picked up.
+
+    Not thread-safe, alerts are partitioned across worker threads and each owns its own cache.
+    """
+    def __init__(self, max_size=10000, ttl=300):
+
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(environment, resource, event):
+
+        return tuple(environment), resource, event
+
+    def get(self, environment, resource, event):
+
+        key = self._key(environment, resource, event)
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return
+        if entry['expires'] < time.time():
+            self._remove(entry)
+            self.misses += 1
+            self.evictions += 1
+            return
+        self._entries[key] = entry  # most recently used
+        self.hits += 1
+        return entry
+
+    def put(self, alertid, environment, resource, event, correlate, severity, status):
+
+        entry = {
+            'id': alertid,
+            'environment': environment,
+            'resource': resource,
+            'event': event,
+            'keys': [self._key(environment, resource, e) for e in set([event] + list(correlate or []))],
+            'severity': severity,
+            'status': status,
+            'expires': time.time() + self.ttl,
+        }
+        for key in entry['keys']:
+            old = self._entries.pop(key, None)
+            if old is not None and old is not entry:
+                self._remove(old)
+            self._entries[key] = entry
+        while len(self._entries) > self.max_size:
+            key, old = self._entries.popitem(last=False)
+            self._remove(old)
+            self.evictions += 1
+
+    def update(self, environment, resource, event, **kwargs):
+
+        key = self._key(environment, resource, event)
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.update(kwargs)
+
+    def invalidate(self, environment, resource, event):
+
+        key = self._key(environment, resource, event)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._remove(entry)
+
+    def _remove(self, entry):
+
+        for key in entry['keys']:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+
+    def load(self, alerts):
+
+        count = 0
+        for alert in alerts:
+            self.put(alert['_id'], alert['environment'], alert['resource'], alert['event'],
+                     alert.get('correlatedEvents'), alert['severity'], alert.get('status'))
+            count += 1
+        LOG.info('Loaded %d alerts into alert cache', count)
+
+    def stats(self):
+
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def __len__(self):
+
+        return len(self._entries)
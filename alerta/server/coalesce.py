@@ -0,0 +1,89 @@
+import time
+
+
+class DuplicateBuffer(object):
+    """
+    Coalesce duplicate alerts received within a short window so that a flood of identical alerts
+    results in one update per window instead of one per alert.
+
+    The first duplicate for a key is written straight away and opens a window. Duplicates for the
+    same key that arrive before the window closes are merged and, when it closes, written with a
+    single update using the fields of the last one received. The broker message ids of merged
+    alerts are kept so they can be acknowledged once the update is written.
+
+    Not thread-safe, each worker thread owns its own buffer.
+    """
+    def __init__(self, window):
+
+        self.window = window  # seconds
+        self._pending = dict()
+
+    @staticmethod
+    def _key(alert):
+
+        return tuple(alert['environment']), alert['resource'], alert['event'], alert['severity']
+
+    def add(self, alert, message_id=None):
+        """
+        Merge an alert into an open window. Returns True if the alert was buffered.
+        """
+        entry = self._pending.get(self._key(alert))
+        if entry is None:
+            return False
+
+        entry['count'] += 1
+        entry['alert'] = alert
+        if message_id:
+            entry['message_ids'].append(message_id)
+        return True
+
+    def open(self, alert):
+        """
+        Open a window for an alert that has just been written as a duplicate.
+        """
+        if self.window > 0:
+            self._pending[self._key(alert)] = {
+                'deadline': time.time() + self.window,
+                'count': 0,
+                'alert': alert,
+                'message_ids': list(),
+            }
+
+    def pop_due(self):
+        """
+        Close all expired windows and return (count, alert, message_ids) for those with merged duplicates.
+        """
+        now = time.time()
+        return self._pop([k for k, v in self._pending.iteritems() if v['deadline'] <= now])
+
+    def pop_resource(self, environment, resource):
+        """
+        Close all windows for a resource, eg. before applying a severity change for it.
+        """
+        environment = tuple(environment)
+        return self._pop([k for k in self._pending if k[0] == environment and k[1] == resource])
+
+    def pop_all(self):
+
+        return self._pop(self._pending.keys())
+
+    def _pop(self, keys):
+
+        flush = list()
+        for key in keys:
+            entry = self._pending.pop(key)
+            if entry['count']:
+                flush.append((entry['count'], entry['alert'], entry['message_ids']))
+        return flush
+
+    def timeout(self):
+        """
+        Seconds until the next window closes or None if there are no open windows.
+        """
+        if not self._pending:
+            return None
+        return max(0, min(v['deadline'] for v in self._pending.itervalues()) - time.time())
+
+    def __len__(self):
+
+        return len(self._pending)
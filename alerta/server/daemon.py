@@ -1,16 +1,23 @@
+import os
 import sys
 import time
+import zlib
+import signal
 import threading
 import Queue
 
-import yaml
-
 from alerta.common import config
 from alerta.common import log as logging
 from alerta.common.daemon import Daemon
-from alerta.alert import Alert, severity, status
+from alerta.alert import Alert, Heartbeat
+from alerta.common import heartbeat
+from alerta.common import codec
 from alerta.common.mq import Messaging, MessageHandler
-from alerta.server.database import Mongo
+from alerta.server.database import Mongo, DUPLICATE, NEW
+from alerta.server.cache import AlertCache
+from alerta.server.coalesce import DuplicateBuffer
+from alerta.server.transform import AlertRules
+from alerta.server.housekeeping import Housekeeping
 
 Version = '2.0.0'
 
@@ -22,317 +29,411 @@ CONF = config.CONF
 ALERTCONF = '/opt/alerta/alerta/alerta.yaml'
 
 _SELECT_TIMEOUT = 30
-
+_CACHE_STATS_INTERVAL = 60  # seconds
+_RESTART_DELAY = 1  # seconds between worker process restarts
+_QUEUE_TIMEOUT = 1  # seconds between checks for shutdown while waiting for room on a full worker queue
 
 
 class WorkerThread(threading.Thread):
-    def __init__(self, mq, queue):
+    def __init__(self, mq, queue, cache=None, rules=None):
 
         threading.Thread.__init__(self)
         LOG.debug('Initialising %s...', self.getName())
 
         self.input_queue = queue   # internal queue
         self.mq = mq               # message broker
+        self.cache = cache         # alert cache for the keys routed to this worker
+        self.rules = rules         # alert transforms and blackout rules
 
         self.db = Mongo()       # mongo database
 
+        self.duplicates = DuplicateBuffer(CONF.server_coalesce_window / 1000.0)
+        self.heartbeats = dict()   # origin -> last heartbeat update time
+        self.stopping = False
+
     def run(self):
 
-        while True:
+        while not self.stopping:
             LOG.debug('Waiting on input queue...')
-            item = self.input_queue.get()
+            try:
+                item = self.input_queue.get(timeout=self.duplicates.timeout())
+            except Queue.Empty:
+                self.flush_duplicates(self.duplicates.pop_due())
+                continue
 
             if not item:
-                LOG.info('%s is shutting down.', self.getName())
+                self.input_queue.task_done()
                 break
 
+            self.flush_duplicates(self.duplicates.pop_due())
+
+            message_id, item = item
+
             # Handle heartbeats
             if item.get_type() == 'Heartbeat':
-                LOG.debug('update heartbeat')
-                #self.hb.update_hb(alert)      # TODO(nsatterl): rename alert to payload or data or something
-
-                try:
-                    self.db.update(
-                        {"origin": alert['origin']},
-                        {"origin": alert['origin'], "version": alert['version'], "createTime": createTime,
-                         "receiveTime": receiveTime},
-                        True)
-                except Exception, e:
-                    LOG.error('Update failed: %s', e)
-                    sys.exit(1)
-                LOG.info('%s : heartbeat from %s', alert['id'], alert['origin'])
+                self.update_heartbeat(item.get_body())
+                self.ack(message_id)
+                self.input_queue.task_done()
                 continue
 
             alert = item.get_body()
-            print alert
-
-            # TODO(nsatterl): fix this!!!!
-            #alert = transform(alert)
+            LOG.debug('Processing alert %s', alert['id'])
 
-            if self.db.is_duplicate(alert['environment'], alert['resource'], alert['event'], alert['severity']):
+            if self.rules:
+                alert = self.rules.transform(alert)
+                if not alert:
+                    self.ack(message_id)
+                    self.input_queue.task_done()
+                    continue
 
-                # Duplicate alert .. 1. update existing document with lastReceiveTime, lastReceiveId, text, summary, value, tags and origin
-                #                    2. increment duplicate count
-
-                LOG.info('%s : Duplicate alert -> update dup count', alert['id'])
+            if self.duplicates.add(alert, message_id):
+                LOG.debug('%s : Duplicate alert -> coalesce', alert['id'])
+                self.input_queue.task_done()
+                continue
 
-                update = {
-                    "lastReceiveTime": alert['receiveTime'],
-                    "expireTime": alert['expireTime'],
-                    "lastReceiveId": alert['id'],
-                    "text": alert['text'],
-                    "summary": alert['summary'],
-                    "value": alert['value'],
-                    "tags": alert['tags'],
-                    "repeat": True,
-                    "origin": alert['origin'],
-                    "trendIndication": 'noChange',
-                }
-                self.db.duplicate_alert(alert['environment'], alert['resource'], alert['event'], **update)
-
-                if alert['status'] not in [status.OPEN, status.ACK, status.CLOSED]:
-                    if alert['severity'] != 'NORMAL':
-                        current_status = status.OPEN
-                    else:
-                        current_status = status.CLOSED
-                else:
-                    current_status = status.UNKNOWN
-
-                if current_status:
-                    self.db.update_status(alert['environment'], alert['resource'], alert['event'], current_status)
+            # Apply any buffered duplicates for this resource before a possible severity change
+            self.flush_duplicates(self.duplicates.pop_resource(alert['environment'], alert['resource']))
 
+            try:
+                action, enriched = self.db.process_alert(alert, self.cache)
+            except Exception, e:
+                # Acknowledge anyway so that an alert that cannot be processed does not hold up the prefetch window
+                LOG.error('%s : Failed to process alert: %s', alert['id'], e)
+                self.dead_letter(item)
+                self.ack(message_id)
                 self.input_queue.task_done()
+                continue
 
-            elif self.db.is_correlated(alert['environment'], alert['resource'], alert['event']):
-
-                # Diff sev alert ... 1. update existing document with severity, createTime, receiveTime, lastReceiveTime, previousSeverity,
-                #                       severityCode, lastReceiveId, text, summary, value, tags and origin
-                #                    2. set duplicate count to zero
-                #                    3. push history
-
-                previous_severity = self.db.get_severity(alert['environment'], alert['resource'], alert['event'])
-                LOG.info('%s : Event and/or severity change %s %s -> %s update details', alert['id'], alert['event'],
-                         previous_severity, alert['severity'])
-
-                # TODO(nsatterl): determine ti based on current and previous severity
-                trend_indication = 'moreSevere' or 'lessSevere'
-
-                update = {
-                    "event": alert['event'],
-                    "severity": alert['severity'],
-                    "createTime": alert['createTime'],
-                    "receiveTime": alert['receiveTime'],
-                    "lastReceiveTime": alert['receiveTime'],
-                    "expireTime": alert['expireTime'],
-                    "previousSeverity": previous_severity,
-                    "lastReceiveId": alert['id'],
-                    "text": alert['text'],
-                    "summary": alert['summary'],
-                    "value": alert['value'],
-                    "tags": alert['tags'],
-                    "repeat": False,
-                    "origin": alert['origin'],
-                    "thresholdInfo": alert['thresholdInfo'],
-                    "trendIndication": trend_indication,
-                    "duplicateCount": 0
-                }
-                enrichedAlert = self.db.modify_alert(alert['environment'], alert['resource'], alert['event'], **update)
-
-                current_status = calculate_status(alert['severity'], previous_severity)
-                if current_status:
-                    self.db.update_status(alert['environment'], alert['resource'], alert['event'], current_status)
+            if action == DUPLICATE:
+                LOG.info('%s : Duplicate alert -> update dup count', alert['id'])
+                self.duplicates.open(alert)
+            else:
+                if action == NEW:
+                    LOG.info('%s : New alert -> insert', alert['id'])
 
                 # Forward alert to notify topic and logger queue
-                self.mq.send(enrichedAlert, CONF.outbound_queue)
-                self.mq.send(enrichedAlert, CONF.outbound_topic)
-
-                self.input_queue.task_done()
+                self.mq.send(enriched, CONF.outbound_queue)
+                self.mq.send(enriched, CONF.outbound_topic)
                 LOG.info('%s : Alert forwarded to %s and %s', alert['id'], CONF.outbound_queue, CONF.outbound_topic)
 
-            else:
-                LOG.info('%s : New alert -> insert', alert['id'])
-                # New alert so ... 1. insert entire document
-                #                  2. push history
-                #                  3. set duplicate count to zero
-
-                trend_indication = 'noChange'
-
-                newAlert = Alert(
-                    alertid=alert['id'],
-                    resource=alert['resource'],
-                    event=alert['event'],
-                    correlate=alert['correlatedEvents'],
-                    group=alert['group'],
-                    value=alert['value'],
-                    severity=alert['severity'],
-                    environment=alert['environment'],
-                    service=alert['service'],
-                    text=alert['text'],
-                    event_type=alert['type'],
-                    tags=alert['tags'],
-                    origin=alert['origin'],
-                    threshold_info=alert['thresholdInfo'],
-                    summary=alert['summary'],
-                    timeout=alert['timeout'],
-                    create_time=alert['createTime'],
-                    receive_time=alert['receiveTime'],
-                    last_receive_time=alert['receiveTime'],
-                    duplicate_count=0,
-                    status=status.OPEN,
-                    trend_indication=trend_indication,
-                    last_receive_id=alert['id'],
-                )
-                self.db.save_alert(newAlert)
-
-                # if alert['severity'] != 'NORMAL':
-                #     status = 'OPEN'
-                # else:
-                #     status = 'CLOSED'
-                #
-                current_status = status.OPEN if alert['severity'] != severity.NORMAL else status.CLOSED
-                LOG.debug('severity = %s => status = %s', alert['severity'], current_status)
-                self.db.update_status(alert['environment'], alert['resource'], alert['event'], current_status)
+            self.ack(message_id)
+            self.input_queue.task_done()
+
+        self.flush_duplicates(self.duplicates.pop_all())
+        LOG.info('%s is shutting down.', self.getName())
+
+    def stop(self):
+        """
+        Stop once the alert in hand is processed. Alerts still queued are left unacknowledged, so
+        the broker redelivers them in order.
+        """
+        self.stopping = True
+        try:
+            self.input_queue.put_nowait(None)  # wake the thread if it is waiting on an empty queue
+        except Queue.Full:
+            pass
 
-                # Forward alert to notify topic and logger queue
-                self.mq.send(newAlert, CONF.outbound_queue)
-                self.mq.send(newAlert, CONF.outbound_topic)
+    def ack(self, message_id):
+        """
+        Acknowledge a message to the broker once it has been committed to the database.
+        """
+        if message_id:
+            self.mq.ack(message_id)
+
+    def dead_letter(self, alert):
+        """
+        Send an alert that could not be processed to the dead letter queue instead of losing it.
+        """
+        self.mq.send(alert, CONF.deadletter_queue)
+        LOG.warning('%s : Alert sent to %s', alert.get_id(), CONF.deadletter_queue)
+
+    def update_heartbeat(self, hb):
+        """
+        Store at most one heartbeat per origin per heartbeat interval, allowing for sender jitter.
+        """
+        now = time.time()
+        if now - self.heartbeats.get(hb['origin'], 0) < CONF.heartbeat_interval * (1 - heartbeat.JITTER):
+            LOG.debug('%s : Heartbeat from %s -> skip', hb['id'], hb['origin'])
+            return
+
+        try:
+            self.db.update_hb(hb)
+        except Exception, e:
+            LOG.error('%s : Failed to update heartbeat from %s: %s', hb['id'], hb['origin'], e)
+            return
+        self.heartbeats[hb['origin']] = now
+        LOG.info('%s : Heartbeat from %s', hb['id'], hb['origin'])
+
+    def flush_duplicates(self, duplicates):
+
+        for count, alert, message_ids in duplicates:
+            LOG.info('%s : %s coalesced duplicate alerts -> update dup count', alert['id'], count)
+            action = DUPLICATE
+            try:
+                if not self.db.increment_duplicate(alert, count):
+                    # Alert was modified or deleted since the window opened so process the last one in full
+                    action, enriched = self.db.process_alert(alert, self.cache)
+            except Exception, e:
+                LOG.error('%s : Failed to update %s duplicate alerts: %s', alert['id'], count, e)
+                # the last alert stands for the whole group so carry the number coalesced into it
+                self.dead_letter(Alert.parse_alert(codec.dumps(dict(alert, duplicateCount=count))))
 
-                self.input_queue.task_done()
+            if action != DUPLICATE:
+                self.mq.send(enriched, CONF.outbound_queue)
+                self.mq.send(enriched, CONF.outbound_topic)
                 LOG.info('%s : Alert forwarded to %s and %s', alert['id'], CONF.outbound_queue, CONF.outbound_topic)
 
-        self.input_queue.task_done()
-
-
-def transform(alert):
-    # Load alert transforms
-    try:
-        alertconf = yaml.load(open(ALERTCONF))
-        LOG.info('Loaded %d alert transforms and blackout rules OK', len(alertconf))
-    except Exception, e:
-        alertconf = dict()
-        LOG.warning('Failed to load alert transforms and blackout rules: %s', e)
-
-    suppress = False
-    for conf in alertconf:
-        LOG.debug('alertconf: %s', conf)
-        if all(item in alert.items() for item in conf['match'].items()):
-            if 'parser' in conf:
-                LOG.debug('Loading parser %s', conf['parser'])
-                try:
-                    exec (open('%s/%s.py' % (CONF.parser_dir, conf['parser']))) in globals(), locals()
-                    LOG.info('Parser %s/%s exec OK', CONF.parser_dir, conf['parser'])
-                except Exception, e:
-                    LOG.warning('Parser %s failed: %s', conf['parser'], e)
-            if 'event' in conf:
-                event = conf['event']
-            if 'resource' in conf:
-                resource = conf['resource']
-            if 'severity' in conf:
-                severity = conf['severity']
-            if 'group' in conf:
-                group = conf['group']
-            if 'value' in conf:
-                value = conf['value']
-            if 'text' in conf:
-                text = conf['text']
-            if 'environment' in conf:
-                environment = [conf['environment']]
-            if 'service' in conf:
-                service = [conf['service']]
-            if 'tags' in conf:
-                tags = conf['tags']
-            if 'correlatedEvents' in conf:
-                correlate = conf['correlatedEvents']
-            if 'thresholdInfo' in conf:
-                threshold = conf['thresholdInfo']
-            if 'suppress' in conf:
-                suppress = conf['suppress']
-            break
-
-    if suppress:
-        LOG.info('%s : Suppressing alert %s', alert['id'], alert['summary'])
-        return
-
-
-def calculate_status(severity, previous_severity):
-    status = None
-    if severity in [severity.DEBUG, severity.INFORM]:
-        status = status.OPEN
-    elif severity == severity.NORMAL:
-        status = status.CLOSED
-    elif severity == severity.WARNING:
-        if previous_severity in severity.NORMAL:
-            status = status.OPEN
-    elif severity == severity.MINOR:
-        if previous_severity in [severity.NORMAL, severity.WARNING]:
-            status = status.OPEN
-    elif severity == severity.MAJOR:
-        if previous_severity in [severity.NORMAL, severity.WARNING, severity.WARNING]:
-            status = status.OPEN
-    elif severity == severity.CRITICAL:
-        if previous_severity in [severity.NORMAL, severity.WARNING, severity.MINOR, severity.MAJOR]:
-            status = status.OPEN
-    else:
-        status = status.UNKNOWN
-
-    return status
+            for message_id in message_ids:
+                self.ack(message_id)
 
 
-class ServerMessage(MessageHandler):
+def _hash(key):
+
+    # crc32 needs bytes, and decoded messages and MongoDB documents hold unicode strings
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return zlib.crc32(key) & 0xffffffff
+
 
-    def __init__(self, queue):
-        self.queue = queue
+def partition(alert, count):
+    """
+    Route all alerts for the same environment and resource to the same worker so that they are
+    processed in order and never race each other.
+    """
+    key = '%s/%s' % (','.join(alert['environment']), alert['resource'])
+    return _hash(key) % count
+
+
+def partition_heartbeat(hb, count):
+    """
+    Route all heartbeats from the same origin to the same worker.
+    """
+    return _hash(hb['origin']) % count
+
+
+class ServerMessage(MessageHandler):
+    """
+    Queue received alerts and heartbeats for the worker threads. Messages are acknowledged by the
+    worker thread once processed. When a worker queue is full, intake waits for room, so that the
+    broker's window of unacknowledged messages holds back further deliveries and alerts for a
+    resource are never reordered.
+    """
+    def __init__(self, queues, mq=None):
+        self.queues = queues
+        self.mq = mq
+        self.shuttingdown = False
 
     def on_message(self, headers, body):
 
-        LOG.info("Received %s %s", headers['type'], headers['correlation-id'])
-        LOG.debug("Received body : %s", body)
+        message_id = headers.get('message-id')
+        item = None
+
+        try:
+            LOG.info("Received %s %s", headers['type'], headers['correlation-id'])
+            LOG.debug("Received body : %s", body)
+
+            if headers['type'] == 'Heartbeat':
+                item = Heartbeat.parse_heartbeat(body)
+                if item:
+                    item.receive_now()
+                    self.put(self.queues[partition_heartbeat(item.get_body(), len(self.queues))], message_id, item)
+                    return
+            elif headers['type'].endswith('Alert'):
+                item = Alert.parse_alert(body)
+                if item:
+                    item.receive_now()
+                    LOG.debug('Queueing alert %s', item.get_body())
+                    self.put(self.queues[partition(item.get_body(), len(self.queues))], message_id, item)
+                    return
+        except Exception, e:
+            # Acknowledge anyway so that a message that cannot be queued does not hold up the prefetch window
+            LOG.error('Failed to queue message %s: %s', message_id, e)
+            if self.mq and item:
+                self.mq.send(item, CONF.deadletter_queue)
+                LOG.warning('%s : Message sent to %s', item.get_id(), CONF.deadletter_queue)
+
+        # Nothing to process so acknowledge straight away
+        if self.mq and message_id:
+            self.mq.ack(message_id)
+
+    def put(self, queue, message_id, item):
+
+        paused = False
+        while not self.shuttingdown:
+            try:
+                queue.put((message_id, item), timeout=_QUEUE_TIMEOUT)
+                return
+            except Queue.Full:
+                if not paused:
+                    LOG.warning('Internal queue is full (%s messages), pausing intake...', queue.maxsize)
+                    paused = True
 
-        if headers['type'] == 'Heartbeat':
-            # TODO(nsatterl): Heartbeat.parse_heartbeat(body) etc.
-            pass
-        elif headers['type'].endswith('Alert'):
-            alert = Alert.parse_alert(body)
-            if alert:
-                alert.receive_now()
-                LOG.debug('Queueing alert %s', alert.get_body())
-                self.queue.put(alert)
+        # Shutting down so leave the message unacknowledged for the broker to redeliver
+        LOG.debug('%s : Not queued during shutdown', item.get_id())
+
+
+def _terminate(signum, frame):
+    raise SystemExit
 
 
 class AlertaDaemon(Daemon):
 
     def run(self):
+
+        # Only the STOMP broker keeps alerts for the same resource on one worker process (see the
+        # JMSXGroupID header), otherwise two processes could both insert the same new alert
+        if CONF.server_processes > 1 and CONF.messaging_transport != 'stomp':
+            LOG.error('Multiple worker processes need the stomp messaging transport, not %s',
+                      CONF.messaging_transport)
+            sys.exit(1)
+
+        if CONF.ensure_indexes:
+            db = Mongo()
+            db.ensure_indexes()
+            db.backfill_shadow_fields()
+            db.rebuild_counts()
+            db.disconnect()
+
+        if CONF.server_processes > 1:
+            self.supervise()
+        else:
+            self.serve()
+
+    def supervise(self):
+        """
+        Fork server_processes worker processes, each with its own MongoDB connection and broker
+        subscription, and restart any that die. Alerts for the same resource are kept on the same
+        worker process by the broker using message groups (see Alert JMSXGroupID header).
+        """
+        self.running = True
+
+        # Only set a flag on SIGTERM, so that it cannot interrupt a fork before the child is tracked
+        def stop(signum, frame):
+            self.shuttingdown = True
+        signal.signal(signal.SIGTERM, stop)
+
+        workers = dict()
+        while not self.shuttingdown:
+            try:
+                for slot in set(range(CONF.server_processes)) - set(workers.values()):
+                    pid = os.fork()
+                    if pid == 0:
+                        signal.signal(signal.SIGTERM, _terminate)
+                        exit_status = 1
+                        try:
+                            self.serve(housekeeping=(slot == 0))
+                            exit_status = 0
+                        except Exception, e:
+                            LOG.error('Worker process #%s failed: %s', slot, e)
+                        finally:
+                            os._exit(exit_status)
+                    workers[pid] = slot
+                    LOG.info('Started worker process #%s with pid %s', slot, pid)
+
+                time.sleep(_RESTART_DELAY)
+
+                while workers:
+                    pid, exit_status = os.waitpid(-1, os.WNOHANG)
+                    if not pid:
+                        break
+                    LOG.error('Worker process #%s with pid %s died (exit status %s), restarting...',
+                              workers.pop(pid), pid, exit_status)
+
+            except (KeyboardInterrupt, SystemExit):
+                self.shuttingdown = True
+
+        LOG.info('Shutdown request received, stopping %s worker processes...', len(workers))
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        for pid in workers:
+            try:
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+
+        self.running = False
+
+    def serve(self, housekeeping=True):
         self.running = True
 
-        # Create internal queue
-        self.queue = Queue.Queue()
+        # Create internal queue and alert cache per worker thread. The broker dispatches at most
+        # server_prefetch unacknowledged messages, so with queues at least that big they never fill.
+        if CONF.server_queue_size < CONF.server_prefetch:
+            LOG.warning('server_queue_size %s is less than server_prefetch %s, intake may pause under load',
+                        CONF.server_queue_size, CONF.server_prefetch)
+        self.queues = [Queue.Queue(maxsize=CONF.server_queue_size) for i in range(CONF.server_threads)]
+        self.caches = [AlertCache(max_size=CONF.server_cache_size / CONF.server_threads, ttl=CONF.server_cache_ttl)
+                       for i in range(CONF.server_threads)]
+
+        # Populate alert caches with the most recently received alerts
+        self.db = Mongo()
+        partitions = [list() for i in range(CONF.server_threads)]
+        for alert in self.db.get_alert_keys(limit=CONF.server_cache_size):
+            partitions[partition(alert, CONF.server_threads)].append(alert)
+        for cache, alerts in zip(self.caches, partitions):
+            cache.load(alerts)
+
+        # Load alert transforms and blackout rules
+        self.rules = AlertRules(ALERTCONF)
 
         # Connect to message queue
         self.mq = Messaging()
-        self.mq.connect(callback=ServerMessage(self.queue))
-        self.mq.subscribe()
+        self.handler = ServerMessage(self.queues, self.mq)
+        self.mq.connect(callback=self.handler)
+        self.mq.subscribe(ack='client-individual', prefetch=CONF.server_prefetch)
 
         # Start worker threads
         LOG.debug('Starting %s alert handler threads...', CONF.server_threads)
+        workers = list()
         for i in range(CONF.server_threads):
-            w = WorkerThread(self.mq, self.queue)
+            w = WorkerThread(self.mq, self.queues[i], self.caches[i], self.rules)
             try:
                 w.start()
             except Exception, e:
                 LOG.error('Worker thread #%s did not start: %s', i, e)
                 continue
+            workers.append(w)
             LOG.info('Started alert handler thread: %s', w.getName())
 
+        # Expire and delete old alerts, in one worker process only
+        self.housekeeping = None
+        if housekeeping and CONF.housekeeping_interval:
+            self.housekeeping = Housekeeping(self.mq)
+            self.housekeeping.start()
+
+        stats_time = time.time()
         while not self.shuttingdown:
             try:
                 time.sleep(0.1)
+
+                if time.time() - stats_time > _CACHE_STATS_INTERVAL:
+                    stats = dict()
+                    for cache in self.caches:
+                        for k, v in cache.stats().iteritems():
+                            stats[k] = stats.get(k, 0) + v
+                    LOG.info('Alert cache size=%(size)s hits=%(hits)s misses=%(misses)s evictions=%(evictions)s', stats)
+                    self.db.update_metrics('cache', stats)
+                    stats_time = time.time()
+
             except (KeyboardInterrupt, SystemExit):
                 self.shuttingdown = True
-                for i in range(CONF.server_threads):
-                    self.queue.put(None)
 
         LOG.info('Shutdown request received...')
         self.running = False
 
+        # Stop intake and the worker threads without waiting for room on full queues
+        self.handler.shuttingdown = True
+        for w in workers:
+            w.stop()
+        for w in workers:
+            w.join()
+
+        if self.housekeeping:
+            self.housekeeping.stop()
+
         LOG.info('Disconnecting from message broker...')
-        self.mq.disconnect()
\ No newline at end of file
+        self.mq.disconnect()
+        self.db.disconnect()
\ No newline at end of file
@@ -7,11 +7,166 @@ import pymongo
 
 from alerta.common import log as logging
 from alerta.common import config
-from alerta.alert import Alert
+from alerta.alert import Alert, severity, status
 
 LOG = logging.getLogger(__name__)
 CONF = config.CONF
 
+# Possible outcomes of processing an incoming alert
+DUPLICATE = 'duplicate'
+CORRELATED = 'correlated'
+NEW = 'new'
+
+# Times to read an alert and apply an incoming alert to it before giving up, if it keeps changing
+_MAX_ATTEMPTS = 3
+
+# Every history entry is also kept in the history collection, in documents of up to
+# HISTORY_BUCKET_SIZE entries per alert per hour
+HISTORY_BUCKET_SIZE = 100
+HISTORY_INDEXES = [
+    [('alertId', pymongo.ASCENDING), ('bucket', pymongo.DESCENDING)],
+]
+
+# The counts collection holds the number of alerts for each (environment, service, severity,
+# status), kept up to date by update_counts() whenever an alert changes and rebuilt from the
+# alerts collection by rebuild_counts() when alerta-server starts
+COUNTS_KEY = [('environment', pymongo.ASCENDING), ('service', pymongo.ASCENDING),
+              ('severity', pymongo.ASCENDING), ('status', pymongo.ASCENDING)]
+
+# Lower-cased copies of the fields that the API filters on are kept under SHADOW so that
+# case-insensitive lookups of literal values can use an index instead of a regex scan
+SHADOW = '_lower'
+SHADOW_FIELDS = ('environment', 'service', 'resource', 'event', 'group', 'tags')
+
+# Indexes on the alerts collection, created by Mongo.ensure_indexes(). Run tools/indexAdvisor.py
+# to check which indexes the server, API and housekeeping queries actually use.
+INDEXES = [
+    # duplicate and correlate lookups, the correlate $or is served by both
+    [('environment', pymongo.DESCENDING), ('resource', pymongo.DESCENDING), ('event', pymongo.DESCENDING)],
+    [('environment', pymongo.DESCENDING), ('resource', pymongo.DESCENDING), ('correlatedEvents', pymongo.DESCENDING)],
+    # API queries filtered on status and sorted newest first, and keyset pagination
+    [('status', pymongo.ASCENDING), ('lastReceiveTime', pymongo.DESCENDING)],
+    [('lastReceiveTime', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)],
+    # housekeeping of expired alerts
+    [('status', pymongo.ASCENDING), ('expireTime', pymongo.ASCENDING)],
+    [('tags', pymongo.ASCENDING)],
+    # case-insensitive API filters
+    [(SHADOW + '.environment', pymongo.ASCENDING), ('lastReceiveTime', pymongo.DESCENDING)],
+    [(SHADOW + '.resource', pymongo.ASCENDING)],
+    [(SHADOW + '.service', pymongo.ASCENDING)],
+    [(SHADOW + '.event', pymongo.ASCENDING)],
+    [(SHADOW + '.group', pymongo.ASCENDING)],
+    [(SHADOW + '.tags', pymongo.ASCENDING)],
+]
+
+
+def push_history(*entries):
+    """
+    Return a $push of entries onto the alert history that keeps only the latest history_max.
+    """
+    return {"history": {'$each': list(entries), '$slice': -CONF.history_max}}
+
+
+def archive_history(db, alertid, entries):
+    """
+    Add history entries for an alert to the current hourly bucket in the history collection,
+    starting a new bucket document when it is full.
+    """
+    bucket = datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    db.history.update({"alertId": alertid, "bucket": bucket, "count": {'$lt': HISTORY_BUCKET_SIZE}},
+                      {'$push': {"history": {'$each': entries}}, '$inc': {"count": len(entries)}},
+                      upsert=True, w=0)  # unacknowledged so it does not add a round trip
+
+
+def _count_keys(doc):
+    """
+    Return the (environment, service, severity, status) counters that an alert is counted in.
+    """
+    keys = set()
+    if doc:
+        for environment in doc.get('environment') or [None]:
+            for service in doc.get('service') or [None]:
+                keys.add((environment, service, doc.get('severity'), doc.get('status')))
+    return keys
+
+
+def update_counts(db, old=None, new=None):
+    """
+    Move an alert from the counters for the old alert document to those for the new one. old is
+    None for a new alert and new is None for a deleted one. Only the fields in COUNTS_KEY are used.
+    """
+    old_keys = _count_keys(old)
+    new_keys = _count_keys(new)
+    for keys, inc in ((old_keys - new_keys, -1), (new_keys - old_keys, 1)):
+        for key in keys:
+            _inc_count(db, key, inc)
+
+
+def _inc_count(db, key, inc):
+
+    environment, service, severity, status = key
+    query = {"environment": environment, "service": service, "severity": severity, "status": status}
+    if inc < 0:
+        # never create a counter or take it below zero, eg. for an alert deleted while counts were rebuilt
+        db.counts.update(dict(query, count={'$gte': -inc}), {'$inc': {"count": inc}})
+        return
+    try:
+        db.counts.update(query, {'$inc': {"count": inc}}, upsert=True)
+    except pymongo.errors.DuplicateKeyError:
+        # another process inserted the same counter first, so it exists now
+        db.counts.update(query, {'$inc': {"count": inc}})
+
+
+def _lower(value):
+
+    if isinstance(value, basestring):
+        return value.lower()
+    elif isinstance(value, list):
+        return [v.lower() if isinstance(v, basestring) else v for v in value]
+    return value
+
+
+def shadow_fields(doc, prefix=''):
+    """
+    Return lower-cased copies of the SHADOW_FIELDS in doc, with their names prefixed by prefix
+    eg. SHADOW + '.' for use in a $set.
+    """
+    return dict((prefix + k, _lower(doc[k])) for k in SHADOW_FIELDS if k in doc)
+
+
+def alert_from_doc(doc):
+    """
+    Return an Alert for an alert document stored in MongoDB.
+    """
+    return Alert(
+        alertid=doc['_id'],
+        resource=doc['resource'],
+        event=doc['event'],
+        correlate=doc['correlatedEvents'],
+        group=doc['group'],
+        value=doc['value'],
+        status=doc.get('status'),
+        severity=doc['severity'],        # TODO(nsatterl): convert to severity type
+        previous_severity=doc.get('previousSeverity'),
+        environment=doc['environment'],
+        service=doc['service'],
+        text=doc['text'],
+        event_type=doc['type'],
+        tags=doc['tags'],
+        origin=doc['origin'],
+        repeat=doc.get('repeat', False),
+        duplicate_count=doc.get('duplicateCount', 0),
+        threshold_info=doc['thresholdInfo'],
+        summary=doc['summary'],
+        timeout=doc['timeout'],
+        last_receive_id=doc.get('lastReceiveId'),
+        create_time=doc['createTime'],
+        expire_time=doc.get('expireTime'),
+        receive_time=doc['receiveTime'],
+        last_receive_time=doc['lastReceiveTime'],
+        trend_indication=doc['trendIndication'],
+    )
+
 
 class Mongo(object):
 
@@ -20,7 +175,7 @@ class Mongo(object):
         # Connect to MongoDB
         try:
             self.conn = pymongo.MongoClient(CONF.mongo_host, CONF.mongo_port)
-            self.db = self.conn.monitoring  # TODO(nsatterl): make 'monitoring' a SYSTEM DEFAULT
+            self.db = self.conn[CONF.mongo_db]
         except Exception, e:
             LOG.error('MongoDB Client error : %s', e)
             sys.exit(1)
@@ -29,8 +184,51 @@ class Mongo(object):
             LOG.info('Connected to MongoDB server %s:%s', CONF.mongo_host, CONF.mongo_port)
             LOG.debug('MongoDB %s, databases available: %s', self.conn.server_info()['version'], ', '.join(self.conn.database_names()))
 
-        self.db.alerts.create_index([('environment', pymongo.DESCENDING), ('resource', pymongo.DESCENDING),
-                                     ('event', pymongo.DESCENDING)])   # TODO(nsatterl): verify perf of this index
+    def ensure_indexes(self):
+        """
+        Create any missing INDEXES in the background, so that the collection is not locked.
+        """
+        for keys in INDEXES:
+            name = self.db.alerts.ensure_index(keys, background=True)
+            LOG.info('Ensured index %s on %s.alerts', name, CONF.mongo_db)
+        for keys in HISTORY_INDEXES:
+            name = self.db.history.ensure_index(keys, background=True)
+            LOG.info('Ensured index %s on %s.history', name, CONF.mongo_db)
+        name = self.db.counts.ensure_index(COUNTS_KEY, unique=True)
+        LOG.info('Ensured index %s on %s.counts', name, CONF.mongo_db)
+
+    def rebuild_counts(self):
+        """
+        Recount the alerts for each (environment, service, severity, status) from scratch and
+        correct the counts collection by the difference, with $inc so that count updates made
+        meanwhile are kept. alerta-server runs this on start before its worker threads, so only
+        alerts changed through the API during the recount can leave a count off until the next.
+        """
+        counts = dict()
+        for doc in self.db.alerts.find({}, {"environment": 1, "service": 1, "severity": 1, "status": 1}):
+            for key in _count_keys(doc):
+                counts[key] = counts.get(key, 0) + 1
+        for doc in self.db.counts.find():
+            key = (doc.get('environment'), doc.get('service'), doc.get('severity'), doc.get('status'))
+            counts[key] = counts.get(key, 0) - doc.get('count', 0)
+
+        corrected = 0
+        for key, inc in counts.iteritems():
+            if inc:
+                _inc_count(self.db, key, inc)
+                corrected += 1
+        LOG.info('Rebuilt alert counts, %s corrected', corrected)
+
+    def backfill_shadow_fields(self):
+        """
+        Add the lower-cased SHADOW fields to alerts that were saved before they existed.
+        """
+        count = 0
+        for doc in self.db.alerts.find({SHADOW: {'$exists': False}}, dict((k, 1) for k in SHADOW_FIELDS)):
+            self.db.alerts.update({'_id': doc['_id']}, {'$set': {SHADOW: shadow_fields(doc)}})
+            count += 1
+        if count:
+            LOG.info('Added lower-case shadow fields to %s alerts', count)
 
     def is_duplicate(self, environment, resource, event, severity=None):
 
@@ -64,28 +262,7 @@ class Mongo(object):
             LOG.warning('Alert not found with environment, resource, event, severity = %s %s %s %s', environment, resource, event, severity)
             return
 
-        return Alert(
-            alertid=response['_id'],
-            resource=response['resource'],
-            event=response['event'],
-            correlate=response['correlatedEvents'],
-            group=response['group'],
-            value=response['value'],
-            severity=response['severity'],        # TODO(nsatterl): convert to severity type
-            environment=response['environment'],
-            service=response['service'],
-            text=response['text'],
-            event_type=response['type'],
-            tags=response['tags'],
-            origin=response['origin'],
-            threshold_info=response['thresholdInfo'],
-            summary=response['summary'],
-            timeout=response['timeout'],
-            create_time=response['createTime'],
-            receive_time=response['receiveTime'],
-            last_receive_time=response['lastReceiveTime'],
-            trend_indication=response['trendIndication'],
-        )
+        return alert_from_doc(response)
 
     def save_alert(self, alert):
 
@@ -99,33 +276,45 @@ class Mongo(object):
             "createTime": body['createTime'],
             "receiveTime": body['receiveTime'],
         }]
+        if 'status' in body:
+            update_time = datetime.datetime.utcnow()
+            update_time = update_time.replace(tzinfo=pytz.utc)
+            body['history'].append({"status": body['status'], "updateTime": update_time})
         body['_id'] = body['id']
         del body['id']
+        body[SHADOW] = shadow_fields(body)
 
-        return self.db.alerts.insert(body, safe=True)
+        response = self.db.alerts.insert(body, safe=True)
+        archive_history(self.db, body['_id'], body['history'])
+        update_counts(self.db, new=body)
+        return response
 
     def modify_alert(self, environment, resource, event, **kwargs):
 
+        history = {
+            "createTime": kwargs['createTime'],
+            "receiveTime": kwargs['receiveTime'],
+            "severity": kwargs['severity'],
+            "event": kwargs['event'],
+            "value": kwargs['value'],
+            "text": kwargs['text'],
+            "id": kwargs['lastReceiveId']
+        }
+
         # FIXME - no native find_and_modify method in this version of pymongo
         no_obj_error = "No matching object found"
-        return self.db.command("findAndModify", 'alerts',
-                               allowable_errors=[no_obj_error],
-                               query={"environment": environment, "resource": resource,
-                                      '$or': [{"event": event}, {"correlatedEvents": event}]},
-                               update={'$set': kwargs,
-                                       '$push': {"history": {
-                                                    "createTime": kwargs['createTime'],
-                                                    "receiveTime": kwargs['receiveTime'],
-                                                    "severity": kwargs['severity'],
-                                                    "event": kwargs['event'],
-                                                    "value": kwargs['value'],
-                                                    "text": kwargs['text'],
-                                                    "id": kwargs['lastReceiveId']
-                                                }
-                                       }
-                               },
-                               new=True,
-                               fields={"history": 0})['value']
+        response = self.db.command("findAndModify", 'alerts',
+                                   allowable_errors=[no_obj_error],
+                                   query={"environment": environment, "resource": resource,
+                                          '$or': [{"event": event}, {"correlatedEvents": event}]},
+                                   update={'$set': kwargs, '$push': push_history(history)},
+                                   new=True,
+                                   fields={"history": 0})['value']
+        if response:
+            archive_history(self.db, response['_id'], [history])
+            if 'previousSeverity' in kwargs:
+                update_counts(self.db, dict(response, severity=kwargs['previousSeverity']), response)
+        return response
 
     def duplicate_alert(self, environment, resource, event, **kwargs):
 
@@ -148,18 +337,287 @@ class Mongo(object):
 
         query = {"environment": environment, "resource": resource,
                  '$or': [{"event": event}, {"correlatedEvents": event}]}
-        update = {'$set': {"status": status}, '$push': {"history": {"status": status, "updateTime": update_time}}}
+        history = {"status": status, "updateTime": update_time}
+        update = {'$set': {"status": status}, '$push': push_history(history)}
 
         LOG.debug('query = %s, update = %s', query, update)
 
         try:
-            self.db.alerts.update(query, update)
+            response = self.db.alerts.find_and_modify(query, update, fields={"environment": 1, "service": 1,
+                                                                            "severity": 1, "status": 1})
         except pymongo.errors.OperationFailure, e:
             LOG.error('MongoDB error: %s', e)
+            return
+        if response:
+            archive_history(self.db, response['_id'], [history])
+            update_counts(self.db, response, dict(response, status=status))
+
+    def expire_alerts(self, now, limit):
+        """
+        Set up to limit Open alerts with an expireTime before now to Expired, oldest first.
+        Returns the expired alerts.
+        """
+        expired = list()
+        for doc in self.db.alerts.find({"status": status.OPEN, "expireTime": {'$lt': now}}, {"_id": 1},
+                                       sort=[('expireTime', pymongo.ASCENDING)]).limit(limit):
+            history = {"status": status.EXPIRED, "updateTime": now}
+            response = self.db.alerts.find_and_modify({"_id": doc['_id'], "status": status.OPEN},
+                                                      {'$set': {"status": status.EXPIRED},
+                                                       '$push': push_history(history)},
+                                                      new=True, fields={"history": 0})
+            if response:
+                archive_history(self.db, response['_id'], [history])
+                update_counts(self.db, dict(response, status=status.OPEN), response)
+                expired.append(alert_from_doc(response))
+        return expired
+
+    def delete_alerts(self, query, limit):
+        """
+        Delete up to limit alerts matching query and return the number deleted.
+        """
+        docs = list(self.db.alerts.find(query, {"environment": 1, "service": 1, "severity": 1, "status": 1})
+                    .limit(limit))
+        if docs:
+            self.db.alerts.remove({"_id": {'$in': [doc['_id'] for doc in docs]}})
+            for doc in docs:
+                update_counts(self.db, old=doc)
+        return len(docs)
+
+    def process_alert(self, alert, cache=None):
+        """
+        Apply an incoming alert with as few round trips as possible. If the alert cache holds
+        the current event, severity and status of the alert, a duplicate or correlated alert is
+        a single update that only matches if they are unchanged. Otherwise they are read first
+        and the alert is applied with one such update or, for a new alert, an insert that
+        includes the initial history. Either way the previous severity and status are known
+        when the update is made, so previousSeverity, trendIndication, status and the alert
+        counts are set in the same atomic update. If the alert changed in the meantime, eg. it
+        was acknowledged via the API, it is read again and the update retried.
+
+        Returns a tuple of (action, alert) where alert is the enriched Alert that should be
+        forwarded or None for duplicates.
+        """
+        environment = alert['environment']
+        resource = alert['resource']
+        event = alert['event']
+
+        previous = cache.get(environment, resource, event) if cache is not None else None
+
+        for attempt in range(_MAX_ATTEMPTS):
+            if not previous:
+                previous = self.db.alerts.find_one({"environment": environment, "resource": resource,
+                                                    '$or': [{"event": event}, {"correlatedEvents": event}]},
+                                                   {"event": 1, "severity": 1, "status": 1})
+            if not previous:
+                new_alert = self._create_alert(alert)
+                if cache is not None:
+                    cache.put(new_alert.get_id(), environment, resource, event, alert['correlatedEvents'],
+                              alert['severity'], new_alert.status)
+                return NEW, new_alert
+
+            if previous['event'] == event and previous['severity'] == alert['severity']:
+                if self.increment_duplicate(alert):
+                    return DUPLICATE, None
+            else:
+                enriched = self._correlate_alert(alert, previous['severity'], previous.get('status'))
+                if enriched:
+                    if cache is not None:
+                        cache.put(enriched.get_id(), environment, resource, event, alert['correlatedEvents'],
+                                  alert['severity'], enriched.status)
+                    return CORRELATED, enriched
+
+            LOG.debug('%s : Alert changed since it was read, trying again', alert['id'])
+            if cache is not None:
+                cache.invalidate(environment, resource, event)
+            previous = None
+
+        raise RuntimeError('Alert changed during %s attempts to apply %s' % (_MAX_ATTEMPTS, alert['id']))
+
+    def increment_duplicate(self, alert, count=1):
+
+        # Duplicate alert .. 1. update existing document with lastReceiveTime, lastReceiveId, text, summary, value, tags and origin
+        #                    2. increment duplicate count by the number of duplicates received
+        #                    3. reopen the alert if it has expired, or was closed while its severity is not normal
+        update = {
+            "lastReceiveTime": alert['receiveTime'],
+            "expireTime": alert['expireTime'],
+            "lastReceiveId": alert['id'],
+            "text": alert['text'],
+            "summary": alert['summary'],
+            "value": alert['value'],
+            "tags": alert['tags'],
+            "repeat": True,
+            "origin": alert['origin'],
+            "trendIndication": severity.NO_CHANGE,
+        }
+        update.update(shadow_fields(update, SHADOW + '.'))
+        query = {"environment": alert['environment'], "resource": alert['resource'],
+                 "event": alert['event'], "severity": alert['severity']}
+
+        if alert['severity'] != severity.NORMAL:
+            current_status, reopen = status.OPEN, [status.EXPIRED, status.CLOSED]
+        else:
+            current_status, reopen = status.CLOSED, [status.EXPIRED]
+
+        response = self.db.alerts.update(dict(query, status={'$nin': reopen}),
+                                         {'$set': update, '$inc': {"duplicateCount": count}},
+                                         safe=True)
+        if response and response.get('updatedExisting'):
+            return True
+
+        update_time = datetime.datetime.utcnow()
+        update_time = update_time.replace(tzinfo=pytz.utc)
+        history = {"status": current_status, "updateTime": update_time}
+        update['status'] = current_status
+
+        previous = self.db.alerts.find_and_modify(dict(query, status={'$in': reopen}),
+                                                  {'$set': update, '$inc': {"duplicateCount": count},
+                                                   '$push': push_history(history)},
+                                                  fields={"environment": 1, "service": 1, "severity": 1,
+                                                          "status": 1})
+        if not previous:
+            return False
+
+        LOG.info('Alert status for %s %s %s alert set to %s', alert['environment'], alert['resource'],
+                 alert['event'], current_status)
+        archive_history(self.db, previous['_id'], [history])
+        update_counts(self.db, previous, dict(previous, status=current_status))
+        return True
+
+    def _correlate_alert(self, alert, previous_severity, previous_status):
+
+        # Diff sev alert ... 1. update existing document with severity, createTime, receiveTime, lastReceiveTime,
+        #                       previousSeverity, lastReceiveId, text, summary, value, tags and origin
+        #                    2. set duplicate count to zero
+        #                    3. push history
+        #
+        # This is a single find-and-modify that only matches if the severity and status are unchanged, so
+        # that the status and alert counts are worked out from the severity and status actually replaced.
+        environment = alert['environment']
+        resource = alert['resource']
+        event = alert['event']
+
+        query = {"environment": environment, "resource": resource,
+                 '$or': [{"event": event}, {"correlatedEvents": event}],
+                 "severity": previous_severity, "status": previous_status}
+        update = {
+            '$set': {
+                "event": event,
+                "severity": alert['severity'],
+                "createTime": alert['createTime'],
+                "receiveTime": alert['receiveTime'],
+                "lastReceiveTime": alert['receiveTime'],
+                "expireTime": alert['expireTime'],
+                "lastReceiveId": alert['id'],
+                "text": alert['text'],
+                "summary": alert['summary'],
+                "value": alert['value'],
+                "tags": alert['tags'],
+                "repeat": False,
+                "origin": alert['origin'],
+                "thresholdInfo": alert['thresholdInfo'],
+                "duplicateCount": 0,
+                SHADOW + '.event': _lower(event),
+                SHADOW + '.tags': _lower(alert['tags']),
+            },
+        }
+        history = [{
+            "createTime": alert['createTime'],
+            "receiveTime": alert['receiveTime'],
+            "severity": alert['severity'],
+            "event": event,
+            "value": alert['value'],
+            "text": alert['text'],
+            "id": alert['id']
+        }]
+        update['$push'] = push_history(*history)
+
+        LOG.info('%s : Event and/or severity change %s %s -> %s update details', alert['id'], event,
+                 previous_severity, alert['severity'])
+
+        update['$set']['previousSeverity'] = previous_severity
+        update['$set']['trendIndication'] = severity.trend(previous_severity, alert['severity'])
+
+        current_status = status.calculate_status(alert['severity'], previous_severity)
+        if current_status and current_status != previous_status:
+            update_time = datetime.datetime.utcnow()
+            update_time = update_time.replace(tzinfo=pytz.utc)
+            LOG.info('Alert status for %s %s %s alert set to %s', environment, resource, event, current_status)
+            update['$set']['status'] = current_status
+            status_history = {"status": current_status, "updateTime": update_time}
+            history.append(status_history)
+            update['$push']['history']['$each'].append(status_history)
+
+        no_obj_error = "No matching object found"
+        enriched = self.db.command("findAndModify", 'alerts',
+                                   allowable_errors=[no_obj_error],
+                                   query=query,
+                                   update=update,
+                                   new=True,
+                                   fields={"history": 0}).get('value')
+        if enriched:
+            archive_history(self.db, enriched['_id'], history)
+            update_counts(self.db, dict(enriched, severity=previous_severity, status=previous_status), enriched)
+            return alert_from_doc(enriched)
+
+    def _create_alert(self, alert):
+
+        # New alert so ... 1. insert entire document with initial status
+        #                  2. push severity and status history
+        #                  3. set duplicate count to zero
+        current_status = status.OPEN if alert['severity'] != severity.NORMAL else status.CLOSED
+
+        new_alert = Alert(
+            alertid=alert['id'],
+            resource=alert['resource'],
+            event=alert['event'],
+            correlate=alert['correlatedEvents'],
+            group=alert['group'],
+            value=alert['value'],
+            severity=alert['severity'],
+            environment=alert['environment'],
+            service=alert['service'],
+            text=alert['text'],
+            event_type=alert['type'],
+            tags=alert['tags'],
+            origin=alert['origin'],
+            threshold_info=alert['thresholdInfo'],
+            summary=alert['summary'],
+            timeout=alert['timeout'],
+            create_time=alert['createTime'],
+            expire_time=alert['expireTime'],
+            receive_time=alert['receiveTime'],
+            last_receive_time=alert['receiveTime'],
+            duplicate_count=0,
+            status=current_status,
+            trend_indication=severity.NO_CHANGE,
+            last_receive_id=alert['id'],
+        )
+        self.save_alert(new_alert)
+
+        return new_alert
+
+    def get_alert_keys(self, limit=0):
+
+        return self.db.alerts.find({}, {"environment": 1, "resource": 1, "event": 1, "correlatedEvents": 1,
+                                        "severity": 1, "status": 1},
+                                   sort=[('lastReceiveTime', pymongo.DESCENDING)]).limit(limit)
+
+    def update_metrics(self, group, metrics):
+
+        for name, value in metrics.iteritems():
+            self.db.status.update(
+                {"group": group, "name": name, "type": "gauge"},
+                {'$set': {"value": value}},
+                True)
 
-    def update_hb(self):
+    def update_hb(self, heartbeat):
 
-        pass
+        self.db.heartbeats.update(
+            {"origin": heartbeat['origin']},
+            {"origin": heartbeat['origin'], "version": heartbeat['version'],
+             "createTime": heartbeat['createTime'], "receiveTime": heartbeat.get('receiveTime')},
+            True)
 
     def disconnect(self):
 
@@ -0,0 +1,104 @@
+import datetime
+import threading
+
+from alerta.common import log as logging
+from alerta.common import config
+from alerta.alert import status, severity
+from alerta.server.database import Mongo
+
+LOG = logging.getLogger(__name__)
+CONF = config.CONF
+
+
+def parse_retention(setting):
+    """
+    Parse a housekeeping_retention setting eg. "Closed=7200,Informational=43200" into a list of
+    (field, value, seconds) where field is "status" or "severity" depending on the name. Alerts
+    with that status or severity are deleted once they have not been received for that long.
+    """
+    retention = list()
+    for rule in setting.split(','):
+        name, _, seconds = rule.strip().partition('=')
+        if not name:
+            continue
+        if name in status.ALL:
+            field = 'status'
+        elif name in severity.ALL:
+            field = 'severity'
+        else:
+            raise ValueError('Invalid housekeeping retention rule %r, not a status or severity' % rule)
+        retention.append((field, name, int(seconds)))
+    return retention
+
+
+class Housekeeping(threading.Thread):
+    """
+    Expire and delete old alerts every housekeeping_interval seconds.
+
+    Open alerts whose expireTime has passed are found with an indexed range scan on
+    (status, expireTime), set to Expired in batches and the status changes are forwarded
+    like any other. Alerts are deleted according to housekeeping_retention in batches of
+    housekeeping_batch_size, no faster than housekeeping_delete_rate alerts per second (0 for
+    no limit) so that large deletes do not cause replication lag.
+    """
+    def __init__(self, mq):
+
+        threading.Thread.__init__(self, name='Housekeeping')
+        self.daemon = True
+
+        self.mq = mq
+        self.db = Mongo()
+        self.retention = parse_retention(CONF.housekeeping_retention)
+        self.stopped = threading.Event()
+
+    def run(self):
+
+        while not self.stopped.wait(CONF.housekeeping_interval):
+            try:
+                self.expire_alerts()
+                self.delete_alerts()
+            except Exception, e:
+                LOG.error('Housekeeping failed: %s', e)
+
+    def expire_alerts(self):
+
+        now = datetime.datetime.utcnow()
+        count = 0
+        while not self.stopped.is_set():
+            expired = self.db.expire_alerts(now, CONF.housekeeping_batch_size)
+            for alert in expired:
+                self.mq.send(alert, CONF.outbound_queue)
+                self.mq.send(alert, CONF.outbound_topic)
+            count += len(expired)
+            if len(expired) < CONF.housekeeping_batch_size:
+                break
+
+        if count:
+            LOG.info('Expired %s alerts and forwarded to %s and %s', count, CONF.outbound_queue, CONF.outbound_topic)
+
+    def delete_alerts(self):
+
+        now = datetime.datetime.utcnow()
+        if CONF.housekeeping_delete_rate:
+            delay = float(CONF.housekeeping_batch_size) / CONF.housekeeping_delete_rate
+        else:
+            delay = 0  # no limit
+
+        for field, value, seconds in self.retention:
+            query = {field: value, 'lastReceiveTime': {'$lt': now - datetime.timedelta(seconds=seconds)}}
+            count = 0
+            while not self.stopped.is_set():
+                deleted = self.db.delete_alerts(query, CONF.housekeeping_batch_size)
+                count += deleted
+                if deleted < CONF.housekeeping_batch_size:
+                    break
+                self.stopped.wait(delay)
+
+            if count:
+                LOG.info('Deleted %s alerts with %s %s older than %s seconds', count, field, value, seconds)
+
+    def stop(self):
+
+        self.stopped.set()
+        self.join()
+        self.db.disconnect()
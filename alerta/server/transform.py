@@ -0,0 +1,89 @@
+import re
+
+from alerta.common import log as logging
+from alerta.common import config
+from alerta.common.transform import WatchedFile, Parsers, load_yaml
+
+LOG = logging.getLogger(__name__)
+CONF = config.CONF
+
+_INDEX_KEYS = ['event', 'resource']
+
+
+class AlertRules(object):
+    """
+    Alert transforms and blackout rules loaded from a YAML file eg.
+
+        - match:
+            group: Deploys
+          parser: DeploysServiceLookup
+
+    The first rule whose match keys all equal the alert values is applied. Rules are indexed
+    on their event or resource match so only a few candidates are tested for each alert.
+    """
+    def __init__(self, path):
+
+        self.rules = WatchedFile(path, self.compile_rules, default=self.compile_rules(None))
+        self.parsers = Parsers()
+
+    @staticmethod
+    def compile_rules(path):
+
+        rules = load_yaml(path) if path else list()
+
+        index = dict()
+        unindexed = list()
+        for pos, rule in enumerate(rules):
+            match = rule.get('match', dict()).items()
+            for key in _INDEX_KEYS:
+                value = rule.get('match', dict()).get(key)
+                if isinstance(value, basestring):
+                    index.setdefault((key, value), list()).append((pos, match, rule))
+                    break
+            else:
+                unindexed.append((pos, match, rule))
+
+        LOG.info('Compiled %d alert transforms and blackout rules (%d indexed)', len(rules), len(rules) - len(unindexed))
+        return index, unindexed
+
+    def match(self, alert):
+
+        index, unindexed = self.rules.get()
+
+        candidates = list(unindexed)
+        for key in _INDEX_KEYS:
+            value = alert.get(key)
+            if isinstance(value, basestring):
+                candidates.extend(index.get((key, value), []))
+
+        for pos, match, rule in sorted(candidates):
+            if all(k in alert and alert[k] == v for k, v in match):
+                return rule
+
+    def transform(self, alert):
+        """
+        Apply the first matching rule to the alert. Returns None if the alert should be suppressed.
+        """
+        rule = self.match(alert)
+        if not rule:
+            return alert
+
+        LOG.debug('%s : Matched alert transform %s', alert['id'], rule)
+
+        if 'parser' in rule:
+            self.parsers.run(rule['parser'], {'alert': alert, 're': re})
+
+        for key in ['event', 'resource', 'severity', 'group', 'value', 'text', 'tags', 'correlatedEvents',
+                    'thresholdInfo']:
+            if key in rule:
+                alert[key] = rule[key]
+        if 'environment' in rule:
+            alert['environment'] = [rule['environment']]
+        if 'service' in rule:
+            alert['service'] = [rule['service']]
+
+        if rule.get('suppress', False):
+            LOG.info('%s : Suppressing alert %s', alert['id'], alert['summary'])
+            return
+
+        return alert
@@ -1,18 +1,21 @@
 
 import os
 import sys
+import time
 import socket
-import select
 import re
-import yaml
-import fnmatch
+import threading
+import Queue
 
 from alerta.common import config
 from alerta.common import log as logging
 from alerta.common.daemon import Daemon
-from alerta.alert import Alert, Heartbeat
+from alerta.alert import Alert
+from alerta.common.heartbeat import HeartbeatScheduler
 from alerta.alert import syslog
 from alerta.common.mq import Messaging
+from alerta.syslog.transform import SyslogRules
+from alerta.syslog.listener import SyslogListener
 
 Version = '2.0.0'
 
@@ -24,6 +27,61 @@ SYSLOGCONF = '/opt/alerta/alerta/alert-syslog.yaml'
 PARSERDIR = '/opt/alerta/bin/parsers'
 
 _SELECT_TIMEOUT = 30
+_STATS_INTERVAL = 60  # seconds
+_BATCH_SIZE = 100  # syslog messages parsed by a worker before sending the alerts to the broker together
+
+_RFC5424_PREFIX = re.compile(r'<\d+>1')
+_RFC5424 = re.compile(r'<(\d+)>1 (\S+) (\S+) (\S+) (\S+) (\S+) (.*)')
+_RFC3164 = re.compile(r'<(\d{1,3})>\S{3}\s{1,2}\d?\d \d{2}:\d{2}:\d{2} (\S+)( (\S+):)? (.*)')
+
+
+class WorkerThread(threading.Thread):
+    """
+    Parse syslog messages taken from the receive queue and publish the alerts to the broker,
+    so that a slow broker never holds up reading from the syslog sockets. Up to _BATCH_SIZE
+    messages already waiting on the queue are taken at once and their alerts sent together.
+    """
+    def __init__(self, mq, queue, parser):
+
+        threading.Thread.__init__(self)
+        LOG.debug('Initialising %s...', self.getName())
+
+        self.input_queue = queue   # internal queue
+        self.mq = mq               # message broker
+        self.parser = parser
+
+    def run(self):
+
+        shutdown = False
+        while not shutdown:
+            # stop at a shutdown marker so that every worker thread gets its own
+            batch = [self.input_queue.get()]
+            while batch[-1] is not None and len(batch) < _BATCH_SIZE:
+                try:
+                    batch.append(self.input_queue.get_nowait())
+                except Queue.Empty:
+                    break
+
+            alerts = list()
+            for data in batch:
+                if data is None:
+                    shutdown = True
+                    continue
+                try:
+                    alerts.extend(self.parser(data))
+                except Exception, e:
+                    LOG.error('Failed to process syslog message %r: %s', data, e)
+
+            if alerts:
+                try:
+                    self.mq.send_many(alerts)
+                except Exception, e:
+                    LOG.error('Failed to send %s syslog alerts: %s', len(alerts), e)
+
+            for data in batch:
+                self.input_queue.task_done()
+
+        LOG.info('%s is shutting down.', self.getName())
 
 
 class SyslogDaemon(Daemon):
@@ -32,62 +90,71 @@ class SyslogDaemon(Daemon):
 
         self.running = True
 
-        LOG.info('Starting UDP listener...')
-        # Set up syslog UDP listener
+        LOG.info('Starting UDP and TCP listeners...')
+        # Set up syslog UDP and TCP listeners
         try:
-            udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            udp.bind(('', CONF.syslog_udp_port))
+            self.listener = SyslogListener(CONF.syslog_udp_port, CONF.syslog_tcp_port)
         except socket.error, e:
-            LOG.error('Syslog UDP error: %s', e)
+            LOG.error('Syslog listener error: %s', e)
             sys.exit(2)
-        LOG.info('Listening on syslog port %s/udp' % CONF.syslog_udp_port)
 
-        LOG.info('Starting TCP listener...')
-        # Set up syslog TCP listener
-        try:
-            tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            tcp.bind(('', CONF.syslog_tcp_port))
-            tcp.listen(5)
-        except socket.error, e:
-            LOG.error('Syslog TCP error: %s', e)
-            sys.exit(2)
-        LOG.info('Listening on syslog port %s/tcp' % CONF.syslog_tcp_port)
+        # Load syslog rules
+        self.rules = SyslogRules(SYSLOGCONF, PARSERDIR)
 
         # Connect to message queue
         self.mq = Messaging()
         self.mq.connect()
 
+        self.heartbeat = HeartbeatScheduler(self.mq)
+        self.heartbeat.add(version=Version)
+        self.heartbeat.start()
+
+        # Received messages are queued for parsing by worker threads, if the queue is full they are dropped
+        self.queue = Queue.Queue(maxsize=CONF.syslog_queue_size)
+        self.received = 0
+        self.dropped = 0
+
+        LOG.debug('Starting %s syslog parser threads...', CONF.syslog_threads)
+        workers = list()
+        for i in range(CONF.syslog_threads):
+            w = WorkerThread(self.mq, self.queue, self.parse_syslog)
+            w.start()
+            workers.append(w)
+            LOG.info('Started syslog parser thread: %s', w.getName())
+
+        stats_time = time.time()
         while not self.shuttingdown:
             try:
                 LOG.debug('Waiting for syslog messages...')
 
-                ip, op, rdy = select.select([udp, tcp], [], [], _SELECT_TIMEOUT)
-                for i in ip:
-                    if i == udp:
-                        data = udp.recv(4096)
-                        LOG.debug('Syslog UDP data received: %s', data)
-                        syslogAlert = self.parse_syslog(data)
-                    if i == tcp:
-                        client, addr = tcp.accept()
-                        data = client.recv(4096)
-                        client.close()
-                        LOG.debug('Syslog TCP data received: %s', data)
-                        syslogAlert = self.parse_syslog(data)
-
-                    self.mq.send(syslogAlert)
-
-                # TODO(nsatterl): don't send a heartbeat after each and every alert
-                LOG.debug('Send heartbeat...')
-                heartbeat = Heartbeat()
-                self.mq.send(heartbeat)
+                for data in self.listener.poll(_SELECT_TIMEOUT):
+                    self.received += 1
+                    try:
+                        self.queue.put_nowait(data)
+                    except Queue.Full:
+                        self.dropped += 1
+
+                if time.time() - stats_time > _STATS_INTERVAL:
+                    LOG.info('Syslog messages received=%s dropped=%s queue depth=%s',
+                             self.received, self.dropped, self.queue.qsize())
+                    stats_time = time.time()
 
             except (KeyboardInterrupt, SystemExit):
                 self.shuttingdown = True
 
+        self.heartbeat.stop()
+
+        for w in workers:
+            self.queue.put(None)
+        for w in workers:
+            w.join()
+
         LOG.info('Shutdown request received...')
         self.running = False
 
+        LOG.info('Closing syslog listeners...')
+        self.listener.close()
+
         LOG.info('Disconnecting from message broker...')
         self.mq.disconnect()
 
@@ -95,11 +162,14 @@ class SyslogDaemon(Daemon):
 
         LOG.debug('Parsing syslog message...')
 
+        syslogAlerts = list()
         for msg in data.split('\n'):
+            if not msg:
+                continue
 
-            if re.match('<\d+>1', msg):
+            if _RFC5424_PREFIX.match(msg):
                 # Parse RFC 5424 compliant message
-                m = re.match(r'<(\d+)>1 (\S+) (\S+) (\S+) (\S+) (\S+) (.*)', msg)
+                m = _RFC5424.match(msg)
                 if m:
                     PRI = int(m.group(1))
                     ISOTIMESTAMP = m.group(2)
@@ -112,11 +182,11 @@ class SyslogDaemon(Daemon):
                     LOG.info("Parsed RFC 5424 message OK")
                 else:
                     LOG.error("Could not parse syslog RFC 5424 message: %s", msg)
-                    return
+                    continue
 
             else:
                 # Parse RFC 3164 compliant message
-                m = re.match(r'<(\d{1,3})>\S{3}\s{1,2}\d?\d \d{2}:\d{2}:\d{2} (\S+)( (\S+):)? (.*)', msg)
+                m = _RFC3164.match(msg)
                 if m:
                     PRI = int(m.group(1))
                     HOSTNAME = m.group(2)
@@ -125,7 +195,7 @@ class SyslogDaemon(Daemon):
                     LOG.info("Parsed RFC 3164 message OK")
                 else:
                     LOG.error("Could not parse syslog RFC 3164 message: %s", msg)
-                    return
+                    continue
 
             facility, level = syslog.decode_priority(PRI)
 
@@ -143,52 +213,51 @@ class SyslogDaemon(Daemon):
             threshold   = ''
             suppress    = False
 
-            try:
-                syslogconf = yaml.load(open(SYSLOGCONF))
-                LOG.info('Loaded %d Syslog configurations OK', len(syslogconf))
-            except Exception, e:
-                LOG.warning('Failed to load Syslog configuration: %s. Using defaults.', e)
-                syslogconf = dict()
-
-            for s in syslogconf:
+            s = self.rules.match(facility, level)
+            if s:
                 LOG.debug('syslogconf: %s', s)
-                if fnmatch.fnmatch('%s.%s' % (facility, level), s['priority']):
-                    if 'parser' in s:
-                        LOG.debug('Loading parser %s', s['parser'])
-                        try:
-                            exec(open('%s/%s.py' % (PARSERDIR, s['parser'])))
-                            LOG.info('Parser %s/%s exec OK', PARSERDIR, s['parser'])
-                        except Exception, e:
-                            LOG.warning('Parser %s failed: %s', s['parser'], e)
-                    if 'event' in s:
-                        event = s['event']
-                    if 'resource' in s:
-                        resource = s['resource']
-                    if 'severity' in s:
-                        severity = s['severity']
-                    if 'group' in s:
-                        group = s['group']
-                    if 'value' in s:
-                        value = s['value']
-                    if 'text' in s:
-                        text = s['text']
-                    if 'environment' in s:
-                        environment = [s['environment']]
-                    if 'service' in s:
-                        service = [s['service']]
-                    if 'tags' in s:
-                        tags = s['tags']
-                    if 'correlatedEvents' in s:
-                        correlate = s['correlatedEvents']
-                    if 'thresholdInfo' in s:
-                        threshold = s['thresholdInfo']
-                    if 'suppress' in s:
-                        suppress = s['suppress']
-                    break
+                if 'parser' in s:
+                    LOG.debug('Loading parser %s', s['parser'])
+                    context = {
+                        're': re, 'PRI': PRI, 'HOSTNAME': HOSTNAME, 'TAG': TAG, 'MSG': MSG,
+                        'facility': facility, 'level': level, 'event': event, 'resource': resource,
+                        'severity': severity, 'group': group, 'value': value, 'text': text,
+                        'environment': environment, 'service': service, 'tags': tags, 'correlate': correlate,
+                        'threshold': threshold, 'suppress': suppress,
+                    }
+                    if self.rules.parsers.run(s['parser'], context):
+                        event, resource, severity = context['event'], context['resource'], context['severity']
+                        group, value, text = context['group'], context['value'], context['text']
+                        environment, service, tags = context['environment'], context['service'], context['tags']
+                        correlate, threshold, suppress = context['correlate'], context['threshold'], context['suppress']
+                if 'event' in s:
+                    event = s['event']
+                if 'resource' in s:
+                    resource = s['resource']
+                if 'severity' in s:
+                    severity = s['severity']
+                if 'group' in s:
+                    group = s['group']
+                if 'value' in s:
+                    value = s['value']
+                if 'text' in s:
+                    text = s['text']
+                if 'environment' in s:
+                    environment = [s['environment']]
+                if 'service' in s:
+                    service = [s['service']]
+                if 'tags' in s:
+                    tags = s['tags']
+                if 'correlatedEvents' in s:
+                    correlate = s['correlatedEvents']
+                if 'thresholdInfo' in s:
+                    threshold = s['thresholdInfo']
+                if 'suppress' in s:
+                    suppress = s['suppress']
 
             if suppress:
                 LOG.info('Suppressing %s.%s syslog message from %s', facility, level, resource)
-                return
+                continue
 
             syslogAlert = Alert(
                 resource=resource,
@@ -205,8 +274,9 @@ class SyslogDaemon(Daemon):
                 origin='%s/%s' % ('alert-syslog', os.uname()[1]),
                 raw_data=msg,
             )
+            syslogAlerts.append(syslogAlert)
 
-            return syslogAlert
+        return syslogAlerts
 
 
 
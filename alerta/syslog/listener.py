@@ -0,0 +1,150 @@
+import errno
+import socket
+import select
+
+from alerta.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+_MAX_DATAGRAMS = 1000       # max UDP datagrams read per wakeup so TCP clients are not starved
+_MAX_FRAME_SIZE = 65536     # drop TCP clients that send this much without a complete frame
+_UDP_RCVBUF = 4 * 1024 * 1024
+
+
+def split_frames(buf):
+    """
+    Split a TCP syslog stream into messages using octet-counting or newline framing (RFC 6587).
+    Returns a list of complete messages and any remaining partial data.
+    """
+    frames = list()
+    while buf:
+        if buf[0].isdigit():
+            # Octet-counting eg. "78 <34>1 2013-02-23T09:18:05.303Z host app - - - message"
+            space = buf.find(' ', 0, 10)
+            if space == -1:
+                if len(buf) >= 10 or not buf.isdigit():
+                    raise ValueError('Invalid octet count %r' % buf[:10])
+                break
+            end = space + 1 + int(buf[:space])
+            if len(buf) < end:
+                break
+            frames.append(buf[space + 1:end])
+            buf = buf[end:]
+        else:
+            # Non-transparent framing ie. each message is terminated by a newline
+            end = buf.find('\n')
+            if end == -1:
+                break
+            frames.append(buf[:end].rstrip('\r\x00'))
+            buf = buf[end + 1:]
+
+    return [f for f in frames if f], buf
+
+
+class SyslogListener(object):
+    """
+    Syslog UDP and TCP listener. All pending UDP datagrams are drained on each wakeup and TCP
+    connections are kept open so that persistent senders (eg. rsyslog) can stream messages.
+    """
+    def __init__(self, udp_port, tcp_port, host=''):
+
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self.udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, _UDP_RCVBUF)
+        except socket.error, e:
+            LOG.warning('Could not set syslog UDP receive buffer size: %s', e)
+        self.udp.bind((host, udp_port))
+        self.udp.setblocking(0)
+        LOG.info('Listening on syslog port %s/udp', self.udp.getsockname()[1])
+
+        self.tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.tcp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.tcp.bind((host, tcp_port))
+        self.tcp.listen(socket.SOMAXCONN)
+        LOG.info('Listening on syslog port %s/tcp', self.tcp.getsockname()[1])
+
+        self.clients = dict()  # client socket -> unframed data
+
+    def poll(self, timeout):
+        """
+        Wait up to timeout seconds for syslog data and return a list of the messages received.
+        """
+        ip, op, rdy = select.select([self.udp, self.tcp] + self.clients.keys(), [], [], timeout)
+
+        messages = list()
+        for s in ip:
+            if s is self.udp:
+                messages.extend(self._read_udp())
+            elif s is self.tcp:
+                self._accept()
+            else:
+                messages.extend(self._read_tcp(s))
+        return messages
+
+    def _read_udp(self):
+
+        messages = list()
+        for i in xrange(_MAX_DATAGRAMS):
+            try:
+                data = self.udp.recv(65535)
+            except socket.error, e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            messages.extend(m for m in data.split('\n') if m)
+
+        LOG.debug('Syslog UDP messages received: %s', len(messages))
+        return messages
+
+    def _accept(self):
+
+        try:
+            client, addr = self.tcp.accept()
+        except socket.error, e:
+            LOG.warning('Syslog TCP accept failed: %s', e)
+            return
+        client.setblocking(0)
+        self.clients[client] = ''
+        LOG.info('Syslog TCP connection from %s:%s', addr[0], addr[1])
+
+    def _read_tcp(self, client):
+
+        try:
+            data = client.recv(65536)
+        except socket.error, e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return list()
+            LOG.warning('Syslog TCP receive failed: %s', e)
+            data = ''
+
+        if not data:
+            # Connection closed, anything left over is the final message
+            remaining = self.clients.pop(client)
+            client.close()
+            return [remaining.rstrip('\r\n\x00')] if remaining.strip() else list()
+
+        try:
+            messages, self.clients[client] = split_frames(self.clients[client] + data)
+        except ValueError, e:
+            LOG.warning('Syslog TCP framing error, closing connection: %s', e)
+            self.close_client(client)
+            return list()
+
+        if len(self.clients[client]) > _MAX_FRAME_SIZE:
+            LOG.warning('Syslog TCP message exceeds %s bytes, closing connection', _MAX_FRAME_SIZE)
+            self.close_client(client)
+
+        LOG.debug('Syslog TCP messages received: %s', len(messages))
+        return messages
+
+    def close_client(self, client):
+
+        self.clients.pop(client, None)
+        client.close()
+
+    def close(self):
+
+        for client in self.clients.keys():
+            self.close_client(client)
+        self.udp.close()
+        self.tcp.close()
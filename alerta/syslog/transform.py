@@ -0,0 +1,53 @@
+import re
+import fnmatch
+
+from alerta.common import log as logging
+from alerta.common.transform import WatchedFile, Parsers, load_yaml
+
+LOG = logging.getLogger(__name__)
+
+
+def _translate(pattern):
+
+    regex = fnmatch.translate(pattern)
+    for suffix in ['\\Z(?ms)', '\\Z']:
+        if regex.endswith(suffix):
+            return regex[:-len(suffix)]
+    return regex
+
+
+class SyslogRules(object):
+    """
+    Syslog rules loaded from a YAML file eg.
+
+        - priority: local7.*
+          parser: SdParamSyslogParser
+
+    The "facility.level" shell-style priority patterns of all rules are translated into a single
+    compiled regex so the first matching rule is found with one match per message.
+    """
+    def __init__(self, path, parser_dir):
+
+        self.rules = WatchedFile(path, self.compile_rules, default=self.compile_rules(None))
+        self.parsers = Parsers(parser_dir)
+
+    @staticmethod
+    def compile_rules(path):
+
+        rules = load_yaml(path) if path else list()
+        if not rules:
+            return rules, None
+
+        regex = re.compile('(?:%s)\\Z' % '|'.join('(?P<r%d>%s)' % (i, _translate(rule['priority']))
+                                                  for i, rule in enumerate(rules)), re.S)
+
+        LOG.info('Compiled %d Syslog configurations', len(rules))
+        return rules, regex
+
+    def match(self, facility, level):
+
+        rules, regex = self.rules.get()
+        if regex:
+            m = regex.match('%s.%s' % (facility, level))
+            if m:
+                return rules[int(m.lastgroup[1:])]
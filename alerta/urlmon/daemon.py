@@ -15,7 +15,8 @@ HTTP_RESPONSES = dict([(k, v[0]) for k, v in BHRH.responses.items()])
 
 from alerta.common import log as logging
 from alerta.common import config
-from alerta.alert import Alert, Heartbeat
+from alerta.alert import Alert
+from alerta.common.heartbeat import HeartbeatScheduler
 from alerta.common.mq import Messaging, MessageHandler
 from alerta.common.daemon import Daemon
 
@@ -87,6 +88,10 @@ class UrlmonDaemon(Daemon):
         self.mq = Messaging()
         self.mq.connect()
 
+        self.heartbeat = HeartbeatScheduler(self.mq)
+        self.heartbeat.add(version=Version)
+        self.heartbeat.start()
+
         # Initialiase alert rules
         init_urls()
         url_mod_time = os.path.getmtime(URLFILE)
@@ -108,10 +113,6 @@ class UrlmonDaemon(Daemon):
                     queue.put(('url', url))
                 queue.put(('timestamp', time.time()))
 
-                LOG.debug('Send heartbeat...')
-                heartbeat = Heartbeat()
-                self.mq.send(heartbeat)
-
                 time.sleep(_check_rate)
 
                 urlmon_qsize = queue.qsize()
@@ -133,6 +134,8 @@ class UrlmonDaemon(Daemon):
             queue.put(('stop', None))
         w.join()
 
+        self.heartbeat.stop()
+
         LOG.info('Disconnecting from message broker...')
         self.mq.disconnect()
 
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#
+# Measure request latency for the alert status API, eg. to compare the v1 CGI scripts under
+# Apache with the WSGI API server (bin/alerta-api). Each base URL is sent the same requests
+# from a number of concurrent clients and the mean and percentile latencies are reported.
+#
+# Usage: python tests/bench_api.py [-n requests] [-c clients] base_url [base_url ...]
+#
+#   eg. python tests/bench_api.py http://monitoring/alerta/api/v1 http://localhost:5000/alerta/api/v1
+
+import sys
+import time
+import json
+import urllib2
+import argparse
+import threading
+
+PATHS = [
+    '/alerts?hide-alert-history=true&limit=100',
+    '/alerts?environment=PROD&hide-alert-details=true',
+    '/alerts?sort-by=lastReceiveTime&fields=resource,event&limit=20',
+    '/resources?limit=100',
+]
+
+
+def client(base_url, paths, latencies, errors):
+
+    for path in paths:
+        start = time.time()
+        try:
+            response = json.loads(urllib2.urlopen(base_url + path).read())['response']
+            if response['status'] != 'ok':
+                errors.append(path)
+        except Exception:
+            errors.append(path)
+        latencies.append(time.time() - start)
+
+
+def percentile(values, p):
+
+    return values[min(int(len(values) * p / 100.0), len(values) - 1)]
+
+
+def bench(base_url, requests, clients):
+
+    latencies = list()
+    errors = list()
+    paths = [PATHS[i % len(PATHS)] for i in range(requests / clients)]
+
+    start = time.time()
+    threads = [threading.Thread(target=client, args=(base_url, paths, latencies, errors)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+
+    latencies.sort()
+    print '%s' % base_url
+    print '  %d requests, %d errors, %.1f requests/sec' % (len(latencies), len(errors), len(latencies) / elapsed)
+    print '  latency ms: mean %.1f  p50 %.1f  p95 %.1f  p99 %.1f  max %.1f' % (
+        1000 * sum(latencies) / len(latencies), 1000 * percentile(latencies, 50),
+        1000 * percentile(latencies, 95), 1000 * percentile(latencies, 99), 1000 * latencies[-1])
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--requests', type=int, default=400, help='Requests per base URL')
+    parser.add_argument('-c', '--clients', type=int, default=4, help='Concurrent clients')
+    parser.add_argument('base_urls', nargs='+', metavar='base_url')
+    args = parser.parse_args()
+
+    for base_url in args.base_urls:
+        bench(base_url.rstrip('/'), args.requests, args.clients)
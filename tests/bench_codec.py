@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+#
+# Encode and decode alerts with json/DateEncoder/strptime and with alerta.common.codec and
+# report alerts/sec for each.
+#
+# Usage: python tests/bench_codec.py [count]
+
+import os
+import sys
+import time
+import json
+import datetime
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'alerta', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from alerta.common import config
+from alerta.common import codec
+from alerta.alert import Alert, severity
+
+DATE_FIELDS = ['createTime', 'receiveTime', 'lastReceiveTime', 'expireTime']
+
+
+class DateEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, (datetime.date, datetime.datetime)):
+            return obj.replace(microsecond=0).isoformat() + ".%03dZ" % (obj.microsecond // 1000)
+        else:
+            return json.JSONEncoder.default(self, obj)
+
+
+def json_encode(body):
+    return json.dumps(body, cls=DateEncoder)
+
+
+def json_decode(s):
+    body = json.loads(s)
+    for k, v in body.iteritems():
+        if k in DATE_FIELDS:
+            body[k] = datetime.datetime.strptime(v, '%Y-%m-%dT%H:%M:%S.%fZ')
+    return body
+
+
+def bench(name, encode, decode, bodies):
+
+    start = time.time()
+    encoded = [encode(body) for body in bodies]
+    encode_time = time.time() - start
+
+    start = time.time()
+    decoded = [decode(s) for s in encoded]
+    decode_time = time.time() - start
+
+    print '%-8s encode %8.0f alerts/sec  decode %8.0f alerts/sec' % (
+        name, len(bodies) / encode_time, len(bodies) / decode_time)
+    return decoded
+
+
+if __name__ == '__main__':
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    config.parse_args(['--use-stderr'])
+
+    bodies = list()
+    for i in xrange(count):
+        alert = Alert('host%05d' % i, 'DiskFull', group='OS', value='%s%%' % (i % 100), severity=severity.MAJOR,
+                      environment=['PROD'], service=['Common'], text='Disk is full.', tags=['dc1', 'os:linux'],
+                      origin='bench_codec', receive_time=datetime.datetime.utcnow(),
+                      last_receive_time=datetime.datetime.utcnow())
+        bodies.append(alert.get_body())
+
+    print '%d alerts, JSON backend %s' % (count, codec.BACKEND)
+    expected = bench('json', json_encode, json_decode, bodies)
+    decoded = bench('codec', codec.dumps, codec.loads, bodies)
+
+    if decoded != expected:
+        print 'FAIL: decoded alerts differ'
+        sys.exit(1)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+#
+# Replay N alerts against a local mongod and report alerts/sec for the baseline ingest path,
+# which made up to five queries and updates per alert, and for process_alert() with and
+# without the alert cache that alerta-server uses.
+#
+# Usage: python tests/bench_server.py [num_alerts]
+
+import os
+import sys
+import time
+import random
+import datetime
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'alerta', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from alerta.common import log as logging
+from alerta.common import config
+from alerta.server.database import Mongo
+from alerta.server.cache import AlertCache
+from alerta.alert import Alert, severity, status
+
+CONF = config.CONF
+
+NUM_ALERTS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+NUM_RESOURCES = 100
+SEVERITIES = [severity.CRITICAL, severity.MAJOR, severity.MINOR, severity.WARNING, severity.NORMAL]
+
+
+def generate(n):
+    """90% duplicates, 10% severity changes across a fixed set of resources."""
+    random.seed(1)
+    current = dict()
+    alerts = list()
+    for i in range(n):
+        resource = 'host%03d' % random.randint(1, NUM_RESOURCES)
+        if resource not in current or random.random() < 0.1:
+            current[resource] = random.choice(SEVERITIES)
+        alert = Alert(resource, 'NodeDown', correlate=['NodeDown', 'NodeUp'], group='Network', value='Down',
+                      severity=current[resource], environment=['BENCH'], service=['Bench'], text='Benchmark alert',
+                      origin='bench_server')
+        alert.receive_now()
+        alerts.append(alert.get_body())
+    return alerts
+
+
+class BaselineMongo(object):
+    """
+    The alert queries and updates made by alerta-server before process_alert(), unchanged.
+    """
+    def __init__(self, db):
+        self.db = db
+
+    def is_duplicate(self, environment, resource, event, severity=None):
+
+        if severity:
+            found = self.db.alerts.find_one({"environment": environment, "resource": resource, "event": event, "severity": severity})
+        else:
+            found = self.db.alerts.find_one({"environment": environment, "resource": resource, "event": event})
+
+        return found is not None
+
+    def is_correlated(self, environment, resource, event):
+
+        found = self.db.alerts.find_one({"environment": environment, "resource": resource,
+                                         '$or': [{"event": event}, {"correlatedEvents": event}]})
+        return found is not None
+
+    def get_severity(self, environment, resource, event):
+
+        return self.db.alerts.find_one({"environment": environment, "resource": resource,
+                                        '$or': [{"event": event}, {"correlatedEvents": event}]},
+                                       {"severity": 1, "_id": 0})['severity']
+
+    def save_alert(self, body):
+
+        body = dict(body)
+        body['history'] = [{
+            "id": body['id'],
+            "event": body['event'],
+            "severity": body['severity'],
+            "value": body['value'],
+            "text": body['text'],
+            "createTime": body['createTime'],
+            "receiveTime": body['receiveTime'],
+        }]
+        body['_id'] = body['id']
+        del body['id']
+
+        return self.db.alerts.insert(body, safe=True)
+
+    def modify_alert(self, environment, resource, event, kwargs):
+
+        no_obj_error = "No matching object found"
+        return self.db.command("findAndModify", 'alerts',
+                               allowable_errors=[no_obj_error],
+                               query={"environment": environment, "resource": resource,
+                                      '$or': [{"event": event}, {"correlatedEvents": event}]},
+                               update={'$set': kwargs,
+                                       '$push': {"history": {
+                                                    "createTime": kwargs['createTime'],
+                                                    "receiveTime": kwargs['receiveTime'],
+                                                    "severity": kwargs['severity'],
+                                                    "event": kwargs['event'],
+                                                    "value": kwargs['value'],
+                                                    "text": kwargs['text'],
+                                                    "id": kwargs['lastReceiveId']
+                                                }
+                                       }
+                               },
+                               new=True,
+                               fields={"history": 0})['value']
+
+    def duplicate_alert(self, environment, resource, event, **kwargs):
+
+        no_obj_error = "No matching object found"
+        return self.db.command("findAndModify", 'alerts',
+                               allowable_errors=[no_obj_error],
+                               query={"environment": environment, "resource": resource, "event": event},
+                               update={'$set': kwargs,
+                                       '$inc': {"duplicateCount": 1}},
+                               new=True,
+                               fields={"history": 0})['value']
+
+    def update_status(self, environment, resource, event, status):
+
+        update_time = datetime.datetime.utcnow()
+
+        query = {"environment": environment, "resource": resource,
+                 '$or': [{"event": event}, {"correlatedEvents": event}]}
+        update = {'$set': {"status": status}, '$push': {"history": {"status": status, "updateTime": update_time}}}
+
+        self.db.alerts.update(query, update)
+
+
+def baseline_path(db, alert):
+    """
+    The sequence of queries and updates that WorkerThread.run() made for each alert before
+    process_alert(), with the same arguments.
+    """
+    if db.is_duplicate(alert['environment'], alert['resource'], alert['event'], alert['severity']):
+        update = {
+            "lastReceiveTime": alert['receiveTime'],
+            "expireTime": alert['expireTime'],
+            "lastReceiveId": alert['id'],
+            "text": alert['text'],
+            "summary": alert['summary'],
+            "value": alert['value'],
+            "tags": alert['tags'],
+            "repeat": True,
+            "origin": alert['origin'],
+            "trendIndication": 'noChange',
+        }
+        db.duplicate_alert(alert['environment'], alert['resource'], alert['event'], **update)
+        # the baseline status check always ends up setting a status for duplicates
+        db.update_status(alert['environment'], alert['resource'], alert['event'], status.OPEN)
+
+    elif db.is_correlated(alert['environment'], alert['resource'], alert['event']):
+        previous_severity = db.get_severity(alert['environment'], alert['resource'], alert['event'])
+        update = {
+            "event": alert['event'],
+            "severity": alert['severity'],
+            "createTime": alert['createTime'],
+            "receiveTime": alert['receiveTime'],
+            "lastReceiveTime": alert['receiveTime'],
+            "expireTime": alert['expireTime'],
+            "previousSeverity": previous_severity,
+            "lastReceiveId": alert['id'],
+            "text": alert['text'],
+            "summary": alert['summary'],
+            "value": alert['value'],
+            "tags": alert['tags'],
+            "repeat": False,
+            "origin": alert['origin'],
+            "thresholdInfo": alert['thresholdInfo'],
+            "trendIndication": 'moreSevere',
+            "duplicateCount": 0
+        }
+        # passed as a dict as the baseline's **update also repeated 'event' and raised TypeError
+        db.modify_alert(alert['environment'], alert['resource'], alert['event'], update)
+        current_status = status.calculate_status(alert['severity'], previous_severity)
+        if current_status:
+            db.update_status(alert['environment'], alert['resource'], alert['event'], current_status)
+
+    else:
+        body = dict(alert, duplicateCount=0, status=status.OPEN, trendIndication='noChange',
+                    lastReceiveTime=alert['receiveTime'], lastReceiveId=alert['id'])
+        db.save_alert(body)
+        current_status = status.OPEN if alert['severity'] != severity.NORMAL else status.CLOSED
+        db.update_status(alert['environment'], alert['resource'], alert['event'], current_status)
+
+
+def new_path(db, alert):
+
+    db.process_alert(alert)
+
+
+def cached_path(db, alert, cache=AlertCache(max_size=NUM_RESOURCES * 10)):
+
+    db.process_alert(alert, cache)
+
+
+def run(name, db, func, alerts):
+
+    db.db.alerts.remove({'environment': ['BENCH']})
+    start = time.time()
+    for alert in alerts:
+        func(db, alert)
+    elapsed = time.time() - start
+    print '%-12s %8d alerts in %7.2fs => %8.1f alerts/sec' % (name, len(alerts), elapsed, len(alerts) / elapsed)
+    return len(alerts) / elapsed
+
+
+if __name__ == '__main__':
+
+    config.parse_args(['--use-stderr'])
+    logging.setup('alerta')
+    CONF.mongo_db = 'alerta_bench'
+
+    db = Mongo()
+    db.ensure_indexes()
+    alerts = generate(NUM_ALERTS)
+
+    before = run('baseline', BaselineMongo(db.db), baseline_path, alerts)
+    after = run('uncached', db, new_path, alerts)
+    cached = run('cached', db, cached_path, alerts)
+    print 'speed-up x%.2f uncached, x%.2f cached' % (after / before, cached / before)
+
+    db.conn.drop_database(CONF.mongo_db)
+    db.disconnect()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#
+# Syslog load generator. Sends syslog messages at increasing rates to a SyslogListener
+# running in-process and reports the highest rate sustained without loss.
+#
+# Usage: python tests/load_syslog.py [--tcp] [--parse] [--duration SECS] [--rates 1000,5000,...]
+
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'alerta', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from alerta.common import config
+from alerta.syslog.listener import SyslogListener
+
+CONF = config.CONF
+
+MESSAGE = '<%d>Feb 23 09:18:05 loadgen%02d app[%d]: load test message %d'
+
+
+class Receiver(threading.Thread):
+
+    def __init__(self, listener, parser=None):
+
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.listener = listener
+        self.parser = parser
+        self.received = 0
+        self.running = True
+
+    def run(self):
+
+        while self.running:
+            for data in self.listener.poll(0.1):
+                if self.parser:
+                    self.received += len(self.parser(data))
+                else:
+                    self.received += 1
+
+
+def send(sock, address, rate, duration, tcp):
+
+    total = int(rate * duration)
+    batch = max(1, rate / 100)
+    start = time.time()
+    for i in xrange(total):
+        msg = MESSAGE % (8 * 23 + 3, i % 50, i % 1000, i)
+        if tcp:
+            sock.sendall('%d %s' % (len(msg), msg))
+        else:
+            sock.sendto(msg, address)
+        if i % batch == 0:
+            delay = start + float(i) / rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+    return total, time.time() - start
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Syslog listener load generator')
+    parser.add_argument('--tcp', action='store_true', help='Send over a persistent TCP connection (default: UDP)')
+    parser.add_argument('--parse', action='store_true', help='Also parse messages into alerts')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds per rate step (default: %(default)s)')
+    parser.add_argument('--rates', default='1000,5000,10000,20000,50000,100000',
+                        help='Comma-separated message rates to try (default: %(default)s)')
+    args = parser.parse_args()
+
+    config.parse_args(['--use-stderr'])
+
+    listener = SyslogListener(0, 0, '127.0.0.1')
+    address = ('127.0.0.1', (listener.tcp if args.tcp else listener.udp).getsockname()[1])
+
+    parse = None
+    if args.parse:
+        from alerta.syslog.daemon import SyslogDaemon, SYSLOGCONF, PARSERDIR
+        from alerta.syslog.transform import SyslogRules
+        daemon = SyslogDaemon('alert-syslog')
+        daemon.rules = SyslogRules(SYSLOGCONF, PARSERDIR)
+        parse = daemon.parse_syslog
+
+    receiver = Receiver(listener, parse)
+    receiver.start()
+
+    if args.tcp:
+        sock = socket.create_connection(address)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    sustained = 0
+    for rate in [int(r) for r in args.rates.split(',')]:
+        before = receiver.received
+        sent, elapsed = send(sock, address, rate, args.duration, args.tcp)
+        time.sleep(1)   # let the receiver drain
+        received = receiver.received - before
+        print '%8d msgs/sec target: sent %8d in %5.2fs (%8.1f msgs/sec), received %8d, lost %6d' % (
+            rate, sent, elapsed, sent / elapsed, received, sent - received)
+        if received < sent:
+            break
+        sustained = sent / elapsed
+
+    print 'sustained %.1f msgs/sec without loss over %s' % (sustained, 'TCP' if args.tcp else 'UDP')
+
+    receiver.running = False
+    receiver.join()
+    sock.close()
+    listener.close()
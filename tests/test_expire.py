@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+#
+# Expire an alert and then send a duplicate of it, with and without the alert cache, and
+# check that it is reopened, its status history is kept and the alert counts follow it.
+#
+# Requires a local mongod. Usage: python tests/test_expire.py
+
+import os
+import sys
+import datetime
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'alerta', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from alerta.common import log as logging
+from alerta.common import config
+from alerta.alert import Alert, severity, status
+from alerta.server.cache import AlertCache
+from alerta.server.database import Mongo, DUPLICATE
+
+CONF = config.CONF
+
+
+def alert(resource):
+
+    alert = Alert(resource, 'DiskFull', group='OS', value='99%', severity=severity.MAJOR, environment=['EXPIRE'],
+                  service=['Expire'], text='Disk is full.', origin='test_expire', timeout=60)
+    alert.receive_now()
+    return alert.get_body()
+
+
+def count(db, current_status):
+
+    found = db.db.counts.find_one({'environment': 'EXPIRE', 'service': 'Expire', 'severity': severity.MAJOR,
+                                   'status': current_status})
+    return found['count'] if found else 0
+
+
+def check(db, resource, cache=None):
+
+    failed = 0
+    db.db.alerts.remove({'environment': ['EXPIRE']})
+    db.rebuild_counts()
+    db.process_alert(alert(resource), cache)
+
+    # expire everything that is open now, as housekeeping would once the timeout has passed
+    expired = db.expire_alerts(datetime.datetime.utcnow() + datetime.timedelta(days=1), 100)
+    if [e.get_body()['resource'] for e in expired] != [resource]:
+        print 'FAIL %s: expired %s' % (resource, [e.get_body()['resource'] for e in expired])
+        failed += 1
+
+    action, _ = db.process_alert(alert(resource), cache)
+    found = db.db.alerts.find_one({'environment': ['EXPIRE'], 'resource': resource})
+    statuses = [h['status'] for h in found['history'] if 'status' in h]
+    if action != DUPLICATE or found['status'] != status.OPEN or found['duplicateCount'] != 1:
+        print 'FAIL %s: %s, status %s, duplicateCount %s (expected %s, %s, 1)' % (
+            resource, action, found['status'], found['duplicateCount'], DUPLICATE, status.OPEN)
+        failed += 1
+    if statuses != [status.OPEN, status.EXPIRED, status.OPEN]:
+        print 'FAIL %s: status history %s' % (resource, statuses)
+        failed += 1
+    if count(db, status.OPEN) != 1 or count(db, status.EXPIRED) != 0:
+        print 'FAIL %s: counts %d Open, %d Expired (expected 1, 0)' % (
+            resource, count(db, status.OPEN), count(db, status.EXPIRED))
+        failed += 1
+    return failed
+
+
+if __name__ == '__main__':
+
+    config.parse_args(['--use-stderr'])
+    logging.setup('alerta')
+    CONF.mongo_db = 'alerta_expire'
+
+    db = Mongo()
+    db.ensure_indexes()
+
+    failed = check(db, 'expire01')
+    failed += check(db, 'expire02', AlertCache())
+
+    print 'expire: %s' % ('FAILED' if failed else 'OK')
+
+    db.conn.drop_database(CONF.mongo_db)
+    db.disconnect()
+    sys.exit(1 if failed else 0)
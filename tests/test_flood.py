@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+#
+# Flood the server worker threads with duplicate alerts from several producer threads
+# at once and check that every alert ends up with the correct duplicateCount.
+#
+# Requires a local mongod. Usage: python tests/test_flood.py
+
+import os
+import sys
+import json
+import Queue
+import threading
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'alerta', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from alerta.common import log as logging
+from alerta.common import config
+from alerta.common.utils import DateEncoder
+from alerta.alert import Alert, severity
+from alerta.server.cache import AlertCache
+from alerta.server.daemon import WorkerThread, ServerMessage
+from alerta.server.database import Mongo
+
+CONF = config.CONF
+
+NUM_PRODUCERS = 8
+NUM_RESOURCES = 20
+NUM_DUPLICATES = 500   # per resource per producer
+
+
+class Sink(object):
+    """Stands in for the message broker, counts forwarded alerts."""
+    def __init__(self):
+        self.sent = 0
+
+    def send(self, alert, destination=None):
+        self.sent += 1
+
+
+def producer(handler, n):
+    for i in range(NUM_DUPLICATES):
+        for r in range(NUM_RESOURCES):
+            alert = Alert('flood%02d' % r, 'DiskFull', group='OS', value='99%', severity=severity.MAJOR,
+                          environment=['FLOOD'], service=['Flood'], text='Disk is full.', origin='test_flood/%s' % n)
+            handler.on_message(alert.get_header(), json.dumps(alert.get_body(), cls=DateEncoder))
+
+
+if __name__ == '__main__':
+
+    config.parse_args(['--use-stderr'])
+    logging.setup('alerta')
+    CONF.mongo_db = 'alerta_flood'
+
+    db = Mongo()
+    db.db.alerts.remove({'environment': ['FLOOD']})
+
+    queues = [Queue.Queue() for i in range(CONF.server_threads)]
+    workers = [WorkerThread(Sink(), queues[i], AlertCache()) for i in range(CONF.server_threads)]
+    for w in workers:
+        w.start()
+
+    handler = ServerMessage(queues)
+    producers = [threading.Thread(target=producer, args=(handler, n)) for n in range(NUM_PRODUCERS)]
+    for p in producers:
+        p.start()
+    for p in producers:
+        p.join()
+
+    for q in queues:
+        q.put(None)
+    for w in workers:
+        w.join()
+
+    failed = 0
+    expected = NUM_PRODUCERS * NUM_DUPLICATES - 1
+    for r in range(NUM_RESOURCES):
+        found = list(db.db.alerts.find({'environment': ['FLOOD'], 'resource': 'flood%02d' % r}))
+        if len(found) != 1 or found[0]['duplicateCount'] != expected:
+            failed += 1
+            print 'FAIL flood%02d: %d documents, duplicateCount %s (expected 1 document, %d)' % (
+                r, len(found), [f['duplicateCount'] for f in found], expected)
+
+    print '%d/%d resources OK' % (NUM_RESOURCES - failed, NUM_RESOURCES)
+
+    db.conn.drop_database(CONF.mongo_db)
+    db.disconnect()
+    sys.exit(1 if failed else 0)
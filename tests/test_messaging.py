@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#
+# Send alerts through the in-memory messaging transport and check that queue messages are
+# delivered once, topic messages to every subscriber and that compressed messages are
+# decompressed for the consumer. Runs without a message broker.
+#
+# Usage: python tests/test_messaging.py
+
+import os
+import sys
+import time
+import threading
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'alerta', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from alerta.common import log as logging
+from alerta.common import config
+from alerta.common import codec
+from alerta.common.mq import Messaging, MessageHandler
+from alerta.alert import Alert
+
+CONF = config.CONF
+
+NUM_ALERTS = 1000
+
+
+class Counter(MessageHandler):
+
+    def __init__(self):
+        self.received = list()
+        self.bodies = list()
+        self.lock = threading.Lock()
+
+    def on_message(self, headers, body):
+        with self.lock:
+            self.received.append(headers['correlation-id'])
+            self.bodies.append((headers, body))
+
+
+def wait_for(handlers, expected, timeout=5):
+
+    deadline = time.time() + timeout
+    while sum(len(h.received) for h in handlers) < expected and time.time() < deadline:
+        time.sleep(0.01)
+
+
+if __name__ == '__main__':
+
+    config.parse_args(['--use-stderr'])
+    logging.setup('alerta')
+    CONF.messaging_transport = 'memory'
+
+    failed = 0
+
+    alerts = [Alert('host%03d' % i, 'ping_fail', environment=['TEST'], service=['Test']) for i in range(NUM_ALERTS)]
+    ids = sorted(alert.get_id() for alert in alerts)
+
+    # Alerts sent to a queue before anyone subscribes are shared between the subscribers
+    producer = Messaging()
+    producer.connect()
+    producer.send_many(alerts[:NUM_ALERTS / 2], '/queue/test')
+
+    consumers = list()
+    for i in range(2):
+        handler = Counter()
+        mq = Messaging()
+        mq.connect(callback=handler)
+        mq.subscribe(destination='/queue/test', ack='client-individual', prefetch=10)
+        consumers.append((mq, handler))
+
+    for alert in alerts[NUM_ALERTS / 2:]:
+        producer.send(alert, '/queue/test')
+
+    wait_for([h for mq, h in consumers], NUM_ALERTS)
+    received = sorted(sum([h.received for mq, h in consumers], []))
+    if received != ids:
+        failed += 1
+        print 'FAIL queue: received %d of %d alerts' % (len(set(received) & set(ids)), NUM_ALERTS)
+    if not all(h.received for mq, h in consumers):
+        failed += 1
+        print 'FAIL queue: alerts not shared between subscribers'
+
+    for mq, handler in consumers:
+        mq.disconnect()
+
+    # Alerts sent to a topic go to every subscriber
+    consumers = list()
+    for i in range(3):
+        handler = Counter()
+        mq = Messaging()
+        mq.connect(callback=handler)
+        mq.subscribe(destination='/topic/test')
+        consumers.append((mq, handler))
+
+    producer.send_many(alerts, '/topic/test')
+
+    wait_for([h for mq, h in consumers], 3 * NUM_ALERTS)
+    for mq, handler in consumers:
+        if sorted(handler.received) != ids:
+            failed += 1
+            print 'FAIL topic: subscriber received %d of %d alerts' % (len(handler.received), NUM_ALERTS)
+        mq.disconnect()
+
+    # Large alerts are compressed on the wire and decompressed for the consumer
+    handler = Counter()
+    mq = Messaging()
+    mq.connect(callback=handler)
+    mq.subscribe(destination='/queue/compress')
+
+    big = Alert('host000', 'ping_fail', environment=['TEST'], service=['Test'], text='x' * 10000)
+    small = Alert('host001', 'ping_fail', environment=['TEST'], service=['Test'])
+    producer.send_many([big, small], '/queue/compress')
+
+    wait_for([handler], 2)
+    encodings = [headers.get('content-encoding') for headers, body in handler.bodies]
+    if encodings != [codec.DEFLATE, None]:
+        failed += 1
+        print 'FAIL compress: content encodings %s' % encodings
+    if [codec.loads(body)['id'] for headers, body in handler.bodies] != [big.get_id(), small.get_id()]:
+        failed += 1
+        print 'FAIL compress: message bodies not decoded'
+    mq.disconnect()
+
+    producer.disconnect()
+
+    print 'messaging: %s' % ('FAIL' if failed else 'OK')
+    sys.exit(1 if failed else 0)
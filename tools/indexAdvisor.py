@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+#
+# Run explain() for the queries that the server, API and housekeeping make against the alerts
+# collection and flag any that scan the whole collection or sort in memory. Sample values are
+# taken from the most recently received alert so that the plans match production.
+#
+# Usage: python tools/indexAdvisor.py [-c alerta.conf]
+#
+# Exits with status 1 if any query does a collection scan. alerta-server creates the indexes
+# defined in alerta.server.database.INDEXES on startup unless run with --no-ensure-indexes.
+
+import os
+import sys
+import datetime
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'alerta', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+import pymongo
+
+from alerta.common import config
+from alerta.common import log as logging
+from alerta.server.database import Mongo, SHADOW
+
+CONF = config.CONF
+
+NEWEST_FIRST = [('lastReceiveTime', pymongo.DESCENDING)]
+
+
+def query_shapes(alert):
+    """
+    Return (name, query, sort) for each query shape, filled in with values from alert.
+    """
+    now = datetime.datetime.utcnow()
+    environment = alert['environment']
+    resource = alert['resource']
+    event = alert['event']
+    correlated = (alert.get('correlatedEvents') or [event])[0]
+    tag = (alert.get('tags') or ['none'])[0]
+
+    return [
+        # alerta-server
+        ('server duplicate', {"environment": environment, "resource": resource, "event": event,
+                              "severity": alert['severity']}, None),
+        ('server correlate', {"environment": environment, "resource": resource,
+                              '$or': [{"event": correlated}, {"correlatedEvents": correlated}]}, None),
+        ('server cache load', {}, NEWEST_FIRST),
+
+        # alert status API
+        ('api alert by id', {'_id': alert['_id']}, None),
+        ('api alerts', {}, NEWEST_FIRST),
+        ('api alerts by status', {'status': {'$in': ['Open', 'Acknowledged']}}, NEWEST_FIRST),
+        ('api alerts from date', {'lastReceiveTime': {'$gt': now - datetime.timedelta(minutes=5), '$lte': now}},
+         NEWEST_FIRST),
+        ('api alerts by env', {SHADOW + '.environment': {'$in': [e.lower() for e in environment]}}, NEWEST_FIRST),
+        ('api alerts by resource', {SHADOW + '.resource': {'$in': [resource.lower()]}}, NEWEST_FIRST),
+        ('api alerts by tag', {SHADOW + '.tags': {'$in': [tag.lower()]}}, NEWEST_FIRST),
+        ('api page', {'$or': [{'lastReceiveTime': {'$lt': alert['lastReceiveTime']}},
+                              {'lastReceiveTime': alert['lastReceiveTime'], '_id': {'$lt': alert['_id']}}]},
+         [('lastReceiveTime', pymongo.DESCENDING), ('_id', pymongo.DESCENDING)]),
+
+        # housekeeping
+        ('housekeeping expired', {'status': 'Open', 'expireTime': {'$lt': now}}, None),
+        ('housekeeping closed', {'status': 'Closed', 'lastReceiveTime': {'$lt': now - datetime.timedelta(hours=2)}},
+         None),
+        ('housekeeping inform', {'severity': 'Informational',
+                                 'lastReceiveTime': {'$lt': now - datetime.timedelta(hours=12)}}, None),
+    ]
+
+
+def _stages(plan):
+
+    yield plan
+    for key in ('inputStage', 'inputStages'):
+        children = plan.get(key) or []
+        for child in children if isinstance(children, list) else [children]:
+            for stage in _stages(child):
+                yield stage
+
+
+def summarise(explain):
+    """
+    Return the indexes used, whether the query scans the collection or sorts in memory and
+    the number of documents scanned, for both the pre and post MongoDB 3.0 explain formats.
+    """
+    if 'queryPlanner' in explain:
+        stages = list(_stages(explain['queryPlanner']['winningPlan']))
+        indexes = [s['indexName'] for s in stages if 'indexName' in s]
+        collscan = any(s['stage'] == 'COLLSCAN' for s in stages)
+        in_memory_sort = any(s['stage'] == 'SORT' for s in stages)
+        scanned = explain.get('executionStats', {}).get('totalDocsExamined')
+    else:
+        clauses = explain.get('clauses') or [explain]
+        cursors = [c['cursor'] for c in clauses]
+        indexes = [c.split(' ', 1)[1] for c in cursors if c.startswith('BtreeCursor')]
+        collscan = any(c.startswith('BasicCursor') for c in cursors)
+        in_memory_sort = any(c.get('scanAndOrder') for c in clauses)
+        scanned = explain.get('nscannedObjects')
+
+    return indexes, collscan, in_memory_sort, scanned
+
+
+if __name__ == '__main__':
+
+    config.parse_args(sys.argv[1:], daemon=False)
+    logging.setup('alerta')
+
+    db = Mongo().db
+    total = db.alerts.count()
+
+    sample = db.alerts.find_one(sort=NEWEST_FIRST)
+    if not sample:
+        print 'No alerts in %s.alerts to take sample values from' % CONF.mongo_db
+        sys.exit(0)
+
+    print '%d alerts in %s.alerts' % (total, CONF.mongo_db)
+    print
+    print '%-24s %-10s %10s  %s' % ('QUERY', 'PLAN', 'SCANNED', 'INDEXES')
+
+    collscans = 0
+    for name, query, sort in query_shapes(sample):
+        cursor = db.alerts.find(query, sort=sort).limit(100)
+        indexes, collscan, in_memory_sort, scanned = summarise(cursor.explain())
+
+        if collscan:
+            collscans += 1
+            plan = 'COLLSCAN'
+        elif in_memory_sort:
+            plan = 'SORT'
+        else:
+            plan = 'ok'
+        print '%-24s %-10s %10s  %s' % (name, plan, scanned if scanned is not None else '-', ', '.join(indexes) or '-')
+
+    if collscans:
+        print
+        print '%d queries scan the whole collection, restart alerta-server to create them' % collscans
+        sys.exit(1)